@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import bindparam, update
+from dotenv import load_dotenv
+
+from database import AsyncSessionLocal
+from models import User
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Write-behind settings for non-critical activity columns (users.last_login)
+# ACTIVITY_FLUSH_MS: how often buffered writes are flushed
+# ACTIVITY_FLUSH_MAX_ENTRIES: flush early once this many users are buffered
+# ACTIVITY_BUFFER_MAX_ENTRIES: hard cap; new entries are dropped (and counted)
+#   while the database can't keep up
+ACTIVITY_FLUSH_MS = int(os.getenv("ACTIVITY_FLUSH_MS", "1000"))
+ACTIVITY_FLUSH_MAX_ENTRIES = int(os.getenv("ACTIVITY_FLUSH_MAX_ENTRIES", "500"))
+ACTIVITY_BUFFER_MAX_ENTRIES = int(os.getenv("ACTIVITY_BUFFER_MAX_ENTRIES", "100000"))
+ACTIVITY_SHUTDOWN_TIMEOUT_SECONDS = 10
+
+_users = User.__table__
+# updated_at is set to itself so its onupdate doesn't fire: a login isn't a
+# profile change, and updated_at feeds the /users ETags
+UPDATE_LAST_LOGIN = (
+    update(_users)
+    .where(_users.c.id == bindparam("user_id"))
+    .values(last_login=bindparam("last_login"), updated_at=_users.c.updated_at)
+)
+
+
+class ActivityBuffer:
+    """
+    Collects last_login timestamps in memory and writes them with one batched
+    UPDATE per flush. Repeated logins by the same user collapse into a single
+    row, so a login storm costs one statement per flush rather than a commit
+    per login. last_login can lag by up to ACTIVITY_FLUSH_MS, and entries
+    still buffered when the process dies are lost.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+        # Counters exposed through stats()
+        self._flushed = 0
+        self._batches = 0
+        self._failures = 0
+        self._dropped = 0
+
+    def record_login(self, user_id: str, when: datetime = None):
+        if user_id not in self._pending and len(self._pending) >= ACTIVITY_BUFFER_MAX_ENTRIES:
+            self._dropped += 1
+            return
+        self._pending[user_id] = when or datetime.utcnow()
+        if len(self._pending) >= ACTIVITY_FLUSH_MAX_ENTRIES:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = ACTIVITY_SHUTDOWN_TIMEOUT_SECONDS):
+        """Stop the timer and write out everything still buffered."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Activity buffer did not drain within %ss; %s entries lost", timeout, len(self._pending))
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), ACTIVITY_FLUSH_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+            if self._stopping:
+                return
+
+    async def flush(self):
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    UPDATE_LAST_LOGIN,
+                    [{"user_id": user_id, "last_login": when} for user_id, when in batch.items()],
+                )
+                await db.commit()
+        except Exception as exc:
+            self._failures += 1
+            logger.error("Activity flush of %s entries failed: %s", len(batch), exc)
+            # Put the batch back for the next flush, keeping anything newer
+            for user_id, when in batch.items():
+                self._pending.setdefault(user_id, when)
+            return 0
+        self._batches += 1
+        self._flushed += len(batch)
+        return len(batch)
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "flushed": self._flushed,
+            "batches": self._batches,
+            "failures": self._failures,
+            "dropped": self._dropped,
+        }
+
+
+buffer = ActivityBuffer()
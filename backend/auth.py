@@ -1,33 +1,62 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Request, Form
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from fastapi.security import HTTPBasic, HTTPBasicCredentials, OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from authlib.integrations.starlette_client import OAuth
 from starlette.config import Config
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
-import uuid
+import hashlib
+import hmac
+import secrets
+import logging
+import time
 import os
 from dotenv import load_dotenv
 
-from database import get_db
-from models import User
+from database import get_async_db, get_primary_db
+from models import User, RefreshToken
+from principal_cache import Principal
+import activity
+import hashing
+import jwt_keys
+import permissions
+import principal_cache
+import ratelimit
+import revocation
+import serialization
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Set up router
 router = APIRouter(tags=["authentication"])
 
 # JWT Configuration
+# Access tokens are signed with the asymmetric keys managed by jwt_keys, so
+# other services can verify them locally against /.well-known/jwks.json
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-for-jwt")
-ALGORITHM = "HS256"
+ALGORITHM = jwt_keys.JWT_ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
 # OAuth2 configuration
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
+# Token introspection (RFC 7662) for the gateway and other resource servers
+# INTROSPECTION_CLIENTS: comma-separated client_id:secret pairs allowed to call
+#   /introspect with HTTP Basic auth; the endpoint rejects everyone when unset
+# INTROSPECTION_MAX_TOKENS: largest batch accepted in one call
+INTROSPECTION_CLIENTS = dict(
+    pair.strip().split(":", 1) for pair in os.getenv("INTROSPECTION_CLIENTS", "").split(",") if ":" in pair
+)
+INTROSPECTION_MAX_TOKENS = int(os.getenv("INTROSPECTION_MAX_TOKENS", "100"))
+introspection_basic = HTTPBasic(auto_error=False)
+
 # Google OAuth setup
 config = Config(environ=os.environ)
 oauth = OAuth(config)
@@ -43,26 +72,44 @@ oauth.register(
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # jti identifies the token for revocation. iat stays in whole seconds, as
+    # introspection clients expect; iat_ms dates the token precisely enough
+    # that a user-wide revocation doesn't catch a login right after it
+    now_ms = int(time.time() * 1000)
+    to_encode.update({"exp": expire, "iat": now_ms // 1000, "iat_ms": now_ms, "jti": secrets.token_urlsafe(16)})
+    return jwt_keys.encode_token(to_encode)
 
-def create_refresh_token(user_id: str, db: Session):
-    token = str(uuid.uuid4())
+def hash_refresh_token(token: str) -> str:
+    # Refresh tokens are random, so an unsalted SHA-256 is enough to keep the
+    # stored value useless if the table leaks
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def create_refresh_token(user_id: str, db: AsyncSession, request: Request = None):
+    """
+    Start a new session for the user; other sessions are left untouched.
+    The session is only added to `db`; the caller commits it together with the
+    rest of the login.
+    """
+    token = secrets.token_urlsafe(32)
     expiry = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     
-    # Store token in database
-    user = db.query(User).filter(User.id == user_id).first()
-    if user:
-        user.refresh_token = token
-        user.refresh_token_expires_at = expiry
-        db.commit()
-        
+    # Store the hashed token in database, with the device it was issued to
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        user_agent=(request.headers.get("user-agent") or "")[:255] if request else None,
+        ip_address=request.client.host if request and request.client else None,
+        expires_at=expiry,
+    ))
     return token
 
+async def purge_expired_refresh_tokens(db: AsyncSession):
+    """Delete expired sessions; uses the expires_at index."""
+    result = await db.execute(delete(RefreshToken).where(RefreshToken.expires_at <= datetime.utcnow()))
+    await db.commit()
+    return result.rowcount
+
 def get_token_from_cookie(request: Request):
-    # Print all cookies for debugging
-    print(f"All cookies: {request.cookies}")
-    
     # Try to get token from different possible cookie names
     token = request.cookies.get("access_token")
     if not token:
@@ -76,76 +123,74 @@ def get_token_from_cookie(request: Request):
             token = auth_header[7:]  # Remove 'Bearer ' prefix
             
     if not token:
-        print("No token found in cookies or Authorization header")
+        logger.debug("No token found in cookies or Authorization header")
         return None
     
-    # Print token for debugging
-    print(f"Found token: {token[:15]}...")
-    
     # Remove Bearer prefix if present
     if token.startswith("Bearer "):
         token = token[7:]
     
     return token
 
-async def verify_token(request: Request = None, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def verify_token(request: Request = None, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    # Print auth information for debugging
-    if request:
-        print(f"verify_token called with Request: Authorization header: {request.headers.get('Authorization')}")
-        print(f"verify_token called with Request: Cookie header: {request.headers.get('Cookie')}")
-    
     # If request is provided, try to get token from cookie
     if request and (not token or token == ""):
-        print("No token in OAuth2 dependency, trying cookies")
         token = get_token_from_cookie(request)
-    elif token:
-        print(f"Token from OAuth2 dependency: {token[:15]}...")
     
     if not token:
-        print("No token found in Authorization header or cookies")
+        logger.debug("No token found in Authorization header or cookies")
         raise credentials_exception
     
     try:
-        print(f"Attempting to decode token: {token[:15]}...")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt_keys.decode_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
-            print("No user_id in token payload")
+            logger.debug("No user_id in token payload")
             raise credentials_exception
-        print(f"Token decoded successfully, user_id: {user_id}")
     except JWTError as e:
-        print(f"JWT decode error: {str(e)}")
+        logger.debug("JWT decode error: %s", e)
+        raise credentials_exception
+    
+    # Bloom filter check; only possible hits touch the database
+    if await revocation.denylist.is_revoked(payload):
+        logger.debug("Revoked token presented for user %s", user_id)
         raise credentials_exception
     
+    # Most requests are served from the principal cache without a DB round trip
+    principal = principal_cache.cache.get(user_id)
+    if principal is not None:
+        return principal
+    
     try:
-        user = db.query(User).filter(User.id == user_id).first()
+        # Roles can't be lazy-loaded on an async session, so load them with the user
+        result = await db.execute(
+            select(User).options(selectinload(User.roles)).where(User.id == user_id)
+        )
+        user = result.scalar_one_or_none()
         if user is None:
-            print(f"User with ID {user_id} not found")
+            logger.debug("Token subject %s not found", user_id)
             raise credentials_exception
             
-        # Ensure user has roles attribute, even if empty
-        if not hasattr(user, 'roles') or user.roles is None:
-            user.roles = []
-            
-        print(f"User found: {user.email}")
-        return user
-    except Exception as e:
-        print(f"Error retrieving user: {str(e)}")
+        principal = Principal.from_user(user)
+        principal_cache.cache.set(principal)
+        return principal
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Error retrieving user %s", user_id)
         raise credentials_exception
 
-# Helper function since users module might not be available due to circular imports
-def verify_password(plain_password, hashed_password):
-    # Import locally to avoid circular imports
-    from users import pwd_context
-    return pwd_context.verify(plain_password, hashed_password)
+# Password checks run in the hashing pool so bcrypt never blocks the event loop
+async def verify_password(plain_password, hashed_password):
+    return await hashing.verify_password_async(plain_password, hashed_password)
 
-def authenticate_user(db: Session, email: str, password: str):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
     """
     Authenticate a user with email and password.
     Raises an exception if authentication fails, returns User object if successful.
@@ -153,14 +198,20 @@ def authenticate_user(db: Session, email: str, password: str):
     # Import locally to avoid circular imports
     from users import get_user_by_email
     
-    user = get_user_by_email(db, email)
+    user = await get_user_by_email(db, email)
     if not user or not user.hashed_password:
-        print(f"User not found or has no password: {email}")
+        logger.debug("Login for unknown or password-less account")
         return False
         
-    if not verify_password(password, user.hashed_password):
-        print(f"Password verification failed for user: {email}")
+    verified, new_hash = await hashing.verify_and_update_async(password, user.hashed_password)
+    if not verified:
+        logger.debug("Password verification failed for user %s", user.id)
         return False
+
+    # Migrate the stored hash to the configured scheme/cost; the caller commits
+    if new_hash:
+        logger.info("Rehashing password for user %s", user.id)
+        user.hashed_password = new_hash
         
     # Ensure user has roles attribute, even if empty
     if not hasattr(user, 'roles') or user.roles is None:
@@ -190,66 +241,49 @@ class EmailPasswordRequestForm:
         # Ensure username is also available for backward compatibility
         self.password = password
         self.username = self.email
-        
-        print(f"EmailPasswordRequestForm initialized with email: {self.email}, username: {self.username}")
+
+# Public keys for verifying access tokens, in JWKS format (RFC 7517)
+@router.get("/.well-known/jwks.json")
+async def jwks():
+    return Response(
+        content=jwt_keys.keyring.jwks(),
+        media_type="application/json",
+        headers={"Cache-Control": f"public, max-age={int(jwt_keys.JWT_KEYS_RELOAD_SECONDS)}"},
+    )
 
 # Login endpoints
-@router.post("/token")
+@router.post("/token", dependencies=[Depends(ratelimit.limit("login", email_field="username"))])
 async def login(
     response: Response, 
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    # The primary, so a password changed moments ago is what gets checked
+    db: AsyncSession = Depends(get_primary_db)
 ):
-    # Print request information for debugging
-    print(f"Login attempt - Headers: {dict(request.headers)}")
-    content_type = request.headers.get("content-type", "")
-    print(f"Login attempt - Content-Type: {content_type}")
-    
     # The OAuth2PasswordRequestForm provides username field
     email = form_data.username
-    print(f"Login attempt - Using email from username field: {email}")
     
     if not email:
-        print("Login attempt - No email provided")
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="Email is required",
         )
     
-    # Debug database lookup
-    from users import get_user_by_email
-    user_exists = get_user_by_email(db, email)
-    if user_exists:
-        print(f"User found in database: {email}")
-    else:
-        print(f"User NOT found in database: {email}")
-    
-    user = authenticate_user(db, email, form_data.password)
+    user = await authenticate_user(db, email, form_data.password)
     if not user:
-        print(f"Authentication failed for email: {email}")
+        logger.info("Failed login", extra={"event": "login_failed", "client_ip": request.client.host if request.client else None})
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Record login time
-    user.last_login = datetime.utcnow()
-    db.commit()
-    
-    # Create tokens
+    # Create tokens. The new session and any password rehash are committed
+    # together; last_login goes through the write-behind buffer.
     access_token = create_access_token(data={"sub": user.id})
-    refresh_token = create_refresh_token(user.id, db)
-    
-    # Get environment
-    is_dev = os.getenv("ENVIRONMENT", "development") == "development"
-    
-    # Get the client's origin from the request header
-    frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
-    
-    # Log what we're doing for debugging
-    print(f"Setting cookies for user {user.email}, token: {access_token[:15]}..., is_dev: {is_dev}, frontend_url: {frontend_url}")
+    refresh_token = await create_refresh_token(user.id, db, request)
+    await db.commit()
+    activity.buffer.record_login(user.id)
     
     # Set access token in cookie - with very permissive settings for development
     response.set_cookie(
@@ -286,17 +320,16 @@ async def login(
         domain=None  # Allow cookies to work on localhost
     )
     
-    # Log the token for debugging
-    print(f"Login successful for {user.email}, token set")
-    print(f"Access token: {access_token[:15]}...")
+    logger.info("Login succeeded", extra={"event": "login", "user_id": user.id})
     
-    # Return a detailed success response with the token info
-    return {
+    # Return a detailed success response with the token info; already
+    # JSON-shaped, so it is rendered directly with the cookies set above
+    return serialization.respond({
         "access_token": access_token,
         "token_type": "bearer",
         "user_id": user.id,
         "email": user.email
-    }
+    }, response)
 
 # Google OAuth routes
 @router.get("/login/google")
@@ -307,7 +340,7 @@ async def login_google(request: Request):
     return await oauth.google.authorize_redirect(request, redirect_uri)
 
 @router.get("/auth/google")
-async def auth_google(request: Request, response: Response, db: Session = Depends(get_db)):
+async def auth_google(request: Request, response: Response, db: AsyncSession = Depends(get_primary_db)):
     token = await oauth.google.authorize_access_token(request)
     user_info = token.get("userinfo")
     
@@ -320,7 +353,7 @@ async def auth_google(request: Request, response: Response, db: Session = Depend
     # Get or create user
     email = user_info.get("email")
     from users import get_user_by_email
-    user = get_user_by_email(db, email)
+    user = await get_user_by_email(db, email)
     
     if not user:
         # Create new user from Google info
@@ -331,18 +364,18 @@ async def auth_google(request: Request, response: Response, db: Session = Depend
             is_verified=user_info.get("email_verified", False),
             oauth_provider="google",
             oauth_id=user_info.get("sub"),
+            last_login=datetime.utcnow(),
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        # Assigns the id the session row needs
+        await db.flush()
     else:
-        # Update existing user with latest info
-        user.last_login = datetime.utcnow()
-        db.commit()
+        activity.buffer.record_login(user.id)
     
-    # Create tokens
+    # Create tokens; a new user and their session are committed together
     access_token = create_access_token(data={"sub": user.id})
-    refresh_token = create_refresh_token(user.id, db)
+    refresh_token = await create_refresh_token(user.id, db, request)
+    await db.commit()
     
     # Set cookies with less strict settings for development
     response.set_cookie(
@@ -366,18 +399,19 @@ async def auth_google(request: Request, response: Response, db: Session = Depend
     )
     
     # Log the token for debugging
-    print(f"Google login successful for {user.email}, token set")
+    logger.info("Google login succeeded", extra={"event": "login", "user_id": user.id, "provider": "google"})
     
     # Redirect to frontend
     frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
     return {"access_token": access_token, "token_type": "bearer", "redirect_url": frontend_url}
 
 # Refresh token endpoint
-@router.post("/refresh-token")
+@router.post("/refresh-token", dependencies=[Depends(ratelimit.limit("refresh"))])
 async def refresh_token(
     response: Response,
     request: Request,
-    db: Session = Depends(get_db)
+    # A lagging replica could still show a refresh token that was just rotated
+    db: AsyncSession = Depends(get_primary_db)
 ):
     # Get refresh token from various possible locations
     refresh_token = None
@@ -392,7 +426,7 @@ async def refresh_token(
             # Try to extract JWT and decode it to see if it has a refresh_token claim
             try:
                 token = auth_header[7:]
-                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+                payload = jwt_keys.decode_token(token)
                 # If token contains refresh_token field (custom implementation)
                 if "refresh_token" in payload:
                     refresh_token = payload["refresh_token"]
@@ -408,21 +442,22 @@ async def refresh_token(
             # Body might not be JSON or might be empty
             pass
     
-    # Log the token status for debugging
-    if refresh_token:
-        print(f"Found refresh token: {refresh_token[:10]}...")
-    else:
-        print("No refresh token found in cookies, headers, or request body")
+    if not refresh_token:
+        logger.debug("No refresh token found in cookies, headers, or request body")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token not found",
         )
     
-    # Find user with this refresh token
-    user = db.query(User).filter(
-        User.refresh_token == refresh_token,
-        User.refresh_token_expires_at > datetime.utcnow()
-    ).first()
+    # Find the session for this refresh token (unique index lookup on the hash)
+    result = await db.execute(
+        select(RefreshToken).where(
+            RefreshToken.token_hash == hash_refresh_token(refresh_token),
+            RefreshToken.expires_at > datetime.utcnow()
+        )
+    )
+    session = result.scalars().first()
+    user = await db.get(User, session.user_id) if session else None
     
     if not user:
         raise HTTPException(
@@ -430,9 +465,11 @@ async def refresh_token(
             detail="Invalid or expired refresh token",
         )
     
-    # Create new tokens
+    # Create new tokens, rotating this session's refresh token
     access_token = create_access_token(data={"sub": user.id})
-    new_refresh_token = create_refresh_token(user.id, db)
+    await db.delete(session)
+    new_refresh_token = await create_refresh_token(user.id, db, request)
+    await db.commit()
     
     # Set new cookies with less strict settings for development
     response.set_cookie(
@@ -467,28 +504,182 @@ async def refresh_token(
     )
     
     # Log the token for debugging
-    print(f"Token refreshed for {user.email}")
+    logger.debug("Token refreshed for user %s", user.id)
     
-    return {"access_token": access_token, "token_type": "bearer"}
+    return serialization.respond({"access_token": access_token, "token_type": "bearer"}, response)
 
-# Convenience dependency for endpoints
-async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# Convenience dependencies for endpoints
+async def get_current_principal(request: Request, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     """
-    Dependency that gets the current user from either the Authorization header or cookies.
-    This automatically passes the request to verify_token.
+    Dependency that gets the current principal (id, email, flags, role names) from
+    either the Authorization header or cookies. Usually served from the principal
+    cache, so prefer it for endpoints that only need to know who is calling.
     """
     return await verify_token(request=request, token=token, db=db)
 
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_primary_db)):
+    """
+    Dependency that gets the current user's full database row, for endpoints that
+    read profile fields or modify the user. The row comes from the primary, so a
+    lagging replica can't hand back a stale password hash; endpoints using it
+    should also take get_primary_db so both share the session.
+    """
+    principal = await verify_token(request=request, token=token, db=db)
+    
+    # db.get() reuses the row verify_token just loaded on a cache miss
+    user = await db.get(User, principal.id, options=[selectinload(User.roles)])
+    if user is None:
+        principal_cache.cache.invalidate(principal.id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+def require_permissions(*names: str):
+    """
+    Dependency factory that returns the current principal if it holds every
+    named permission and raises 403 otherwise. The required mask is compiled
+    once per policy version, so the check is one AND against the principal's
+    cached mask.
+    """
+    unknown = set(names) - set(permissions.PERMISSIONS)
+    if unknown:
+        raise ValueError(f"Unknown permissions: {', '.join(sorted(unknown))}")
+    compiled = {"version": None, "mask": None}
+
+    async def dependency(principal: Principal = Depends(get_current_principal)):
+        policy = permissions.policy
+        if compiled["version"] != policy.version:
+            compiled["mask"], compiled["version"] = policy.mask_of(names), policy.version
+        if not principal.has_permissions(compiled["mask"]):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not enough permissions"
+            )
+        return principal
+
+    return dependency
+
 # Logout endpoint
 @router.post("/logout")
-async def logout(response: Response, request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Clear refresh token in database
-    current_user.refresh_token = None
-    current_user.refresh_token_expires_at = None
-    db.commit()
+async def logout(
+    response: Response,
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_primary_db)
+):
+    # End this device's session only; other devices stay signed in
+    refresh_token = request.cookies.get("refresh_token")
+    if refresh_token:
+        await db.execute(
+            delete(RefreshToken).where(
+                RefreshToken.token_hash == hash_refresh_token(refresh_token),
+                RefreshToken.user_id == current_user.id,
+            )
+        )
+    
+    # Revoke the access token used for this request; it was verified above
+    await revocation.denylist.revoke_token(db, jwt_keys.decode_token(token or get_token_from_cookie(request)))
+    await db.commit()
+    principal_cache.cache.invalidate(current_user.id)
     
     # Clear cookies
     response.delete_cookie(key="access_token")
     response.delete_cookie(key="refresh_token")
     
     return {"detail": "Successfully logged out"}
+
+# Token introspection
+def authenticate_introspection_client(credentials: Optional[HTTPBasicCredentials] = Depends(introspection_basic)):
+    """Dependency that checks the calling resource server's client credentials."""
+    secret = INTROSPECTION_CLIENTS.get(credentials.username) if credentials else None
+    if secret is None or not hmac.compare_digest(credentials.password.encode(), secret.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid client credentials",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return credentials.username
+
+async def introspect_tokens(tokens, db: AsyncSession):
+    """
+    Introspect a batch of access tokens, returning one RFC 7662 response per
+    token in the same order. Subjects missing from the principal cache are
+    loaded together with a single IN query.
+    """
+    payloads = {}
+    for token in set(tokens):
+        try:
+            payload = jwt_keys.decode_token(token)
+        except JWTError:
+            continue
+        if payload.get("sub") and not await revocation.denylist.is_revoked(payload):
+            payloads[token] = payload
+
+    principals = {}
+    missing = set()
+    for payload in payloads.values():
+        principal = principal_cache.cache.get(payload["sub"])
+        if principal is not None:
+            principals[principal.id] = principal
+        else:
+            missing.add(payload["sub"])
+    if missing:
+        result = await db.execute(
+            select(User).options(selectinload(User.roles)).where(User.id.in_(missing))
+        )
+        for user in result.scalars():
+            principal = Principal.from_user(user)
+            principal_cache.cache.set(principal)
+            principals[principal.id] = principal
+
+    responses = []
+    for token in tokens:
+        payload = payloads.get(token)
+        principal = principals.get(payload["sub"]) if payload else None
+        if principal is None or not principal.is_active:
+            responses.append({"active": False})
+            continue
+        responses.append({
+            "active": True,
+            "sub": principal.id,
+            "username": principal.email,
+            "roles": sorted(principal.role_names),
+            "token_type": "Bearer",
+            "exp": payload.get("exp"),
+            # Tokens issued before iat became an integer carry a float
+            "iat": int(payload["iat"]) if payload.get("iat") is not None else None,
+            "jti": payload.get("jti"),
+        })
+    return responses
+
+@router.post("/introspect", dependencies=[Depends(authenticate_introspection_client)])
+async def introspect(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    RFC 7662 token introspection. A form-encoded `token` gets a single
+    response as the RFC describes; a JSON body `{"tokens": [...]}` gets
+    `{"results": [...]}` with one response per token, in order.
+    """
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = await request.json()
+            tokens = body["tokens"]
+        except (ValueError, TypeError, KeyError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Expected {"tokens": [...]}')
+        if not isinstance(tokens, list) or not all(isinstance(token, str) for token in tokens):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="tokens must be a list of strings")
+        if len(tokens) > INTROSPECTION_MAX_TOKENS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {INTROSPECTION_MAX_TOKENS} tokens per request",
+            )
+        return serialization.respond({"results": await introspect_tokens(tokens, db)})
+
+    form = await request.form()
+    token = form.get("token")
+    if not token:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="token is required")
+    return serialization.respond((await introspect_tokens([token], db))[0])
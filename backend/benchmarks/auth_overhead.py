@@ -0,0 +1,89 @@
+"""
+Per-call cost of the authentication hot path (verify_token on a cached
+principal), measured in-process without HTTP or the database in the way.
+
+Logging goes wherever the process would normally write it; pass --log-file to
+send stdout/stderr to a file so log I/O is part of the measurement. Results
+are printed as JSON.
+
+Usage (from the backend directory):
+    python benchmarks/auth_overhead.py --iterations 20000 --log-file /tmp/auth.log
+
+Run it on two checkouts to compare per-request overhead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def measure(iterations):
+    import auth
+    import principal_cache
+    from principal_cache import Principal
+    from starlette.requests import Request
+
+    principal = Principal(id="bench-user", email="bench@example.com", is_active=True, is_verified=True, role_names=["user"])
+    token = auth.create_access_token(data={"sub": principal.id})
+    principal_cache.cache.set(principal)
+
+    headers = [
+        (b"authorization", f"Bearer {token}".encode()),
+        (b"cookie", f"access_token=Bearer {token}; refresh_token=abc".encode()),
+        (b"user-agent", b"bench"),
+    ]
+    request = Request({"type": "http", "method": "GET", "path": "/users/me", "headers": headers, "query_string": b""})
+
+    # Warm up key loading and caches
+    for _ in range(100):
+        await auth.verify_token(request=request, token=token, db=None)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        # Keep the entry fresh so every call is a cache hit
+        if principal_cache.cache.get(principal.id) is None:
+            principal_cache.cache.set(principal)
+        await auth.verify_token(request=request, token=token, db=None)
+    elapsed = time.perf_counter() - started
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--log-file", help="redirect stdout/stderr (and therefore log output) to this file")
+    args = parser.parse_args()
+
+    real_stdout = sys.stdout
+    if args.log_file:
+        log_file = open(args.log_file, "w")
+        sys.stdout = sys.stderr = log_file
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        os.environ.setdefault("JWT_KEYS_DIR", os.path.join(tmp, "jwt_keys"))
+        sys.path.insert(0, BACKEND_DIR)
+        import main as app_main  # noqa: F401  (applies the app's logging setup)
+
+        elapsed = asyncio.run(measure(args.iterations))
+
+    if args.log_file:
+        sys.stdout.flush()
+        sys.stdout = real_stdout
+
+    print(json.dumps({
+        "path": "verify_token (cached principal)",
+        "iterations": args.iterations,
+        "total_seconds": round(elapsed, 3),
+        "per_call_us": round(elapsed / args.iterations * 1e6, 2),
+        "calls_per_second": round(args.iterations / elapsed, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Measure what a password verify costs on this host and suggest hash parameters
+that land close to a target verify latency.
+
+bcrypt cost doubles with every round, so the search walks up the rounds until
+a verify exceeds the target. For argon2 (only if argon2-cffi is installed) the
+memory cost is fixed and time_cost is increased instead. Each setting is timed
+over several verifies and the median is used. Results, including the
+suggested PASSWORD_* environment settings and the rough logins/second one
+hashing worker can sustain, are printed as JSON.
+
+Usage (from the backend directory):
+    python benchmarks/hash_calibration.py --target-ms 250
+    python benchmarks/hash_calibration.py --target-ms 100 --argon2 --argon2-memory 32768
+
+Run it on each deployment tier; stored hashes migrate to new settings as users
+log in (see authenticate_user).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "calibration-password-1"
+
+
+def time_verify(context, samples):
+    """Median seconds for one verify with this context's default settings."""
+    hashed = context.hash(PASSWORD)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.verify(PASSWORD, hashed)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def describe(setting, seconds):
+    return dict(setting, verify_ms=round(seconds * 1000, 2), verifies_per_second_per_worker=round(1 / seconds, 1))
+
+
+def calibrate_bcrypt(build_context, target, samples, min_rounds=4, max_rounds=16):
+    results = []
+    chosen = None
+    for rounds in range(min_rounds, max_rounds + 1):
+        seconds = time_verify(build_context(schemes=["bcrypt"], bcrypt_rounds=rounds), samples)
+        results.append(describe({"rounds": rounds}, seconds))
+        if seconds <= target:
+            chosen = results[-1]
+        else:
+            break
+    return {"measured": results, "suggested": chosen}
+
+
+def calibrate_argon2(build_context, target, samples, memory_cost, parallelism, max_time_cost=20):
+    try:
+        import argon2  # noqa: F401
+    except ImportError:
+        return {"skipped": "argon2-cffi is not installed"}
+    results = []
+    chosen = None
+    for time_cost in range(1, max_time_cost + 1):
+        context = build_context(
+            schemes=["argon2"],
+            argon2_time_cost=time_cost,
+            argon2_memory_cost=memory_cost,
+            argon2_parallelism=parallelism,
+        )
+        seconds = time_verify(context, samples)
+        results.append(describe({"time_cost": time_cost, "memory_cost": memory_cost, "parallelism": parallelism}, seconds))
+        if seconds <= target:
+            chosen = results[-1]
+        else:
+            break
+    return {"measured": results, "suggested": chosen}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=250.0, help="target latency of a single verify")
+    parser.add_argument("--samples", type=int, default=5, help="verifies timed per setting")
+    parser.add_argument("--argon2", action="store_true", help="also calibrate argon2")
+    parser.add_argument("--argon2-memory", type=int, default=65536, help="argon2 memory cost in KiB")
+    parser.add_argument("--argon2-parallelism", type=int, default=4)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BACKEND_DIR)
+    from hashing import build_context, PASSWORD_HASH_WORKERS
+
+    target = args.target_ms / 1000
+    report = {
+        "target_ms": args.target_ms,
+        "cpu_count": os.cpu_count(),
+        "hash_workers": PASSWORD_HASH_WORKERS,
+        "bcrypt": calibrate_bcrypt(build_context, target, args.samples),
+    }
+    env = {}
+    suggested = report["bcrypt"]["suggested"]
+    if suggested:
+        env["PASSWORD_HASH_SCHEMES"] = "bcrypt"
+        env["PASSWORD_BCRYPT_ROUNDS"] = suggested["rounds"]
+
+    if args.argon2:
+        report["argon2"] = calibrate_argon2(build_context, target, args.samples, args.argon2_memory, args.argon2_parallelism)
+        argon2_suggested = report["argon2"].get("suggested")
+        if argon2_suggested:
+            suggested = argon2_suggested
+            # Keep bcrypt listed so existing hashes still verify (and get upgraded)
+            env["PASSWORD_HASH_SCHEMES"] = "argon2,bcrypt"
+            env["PASSWORD_ARGON2_TIME_COST"] = suggested["time_cost"]
+            env["PASSWORD_ARGON2_MEMORY_COST"] = suggested["memory_cost"]
+            env["PASSWORD_ARGON2_PARALLELISM"] = suggested["parallelism"]
+
+    if suggested:
+        report["estimated_logins_per_second"] = round(suggested["verifies_per_second_per_worker"] * PASSWORD_HASH_WORKERS, 1)
+    report["env"] = env
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
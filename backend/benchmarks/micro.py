@@ -0,0 +1,148 @@
+"""
+In-process micro-benchmarks for the auth hot paths:
+
+- create_access_token: signing one access token
+- verify_token: the full dependency on a cached principal (no DB)
+- user_response: UserResponse.from_orm(user) plus JSON encoding
+- user_response_fastapi / user_response_compiled: a profile response body
+  rendered through FastAPI's response_model path (validation,
+  jsonable_encoder, JSONResponse) versus the compiled serializer and
+  serialization.respond() the /users/* endpoints use
+- token_response_fastapi / token_response_compiled: the same comparison for
+  the /token response dict
+
+Each is timed over --iterations calls after a warm-up; results (per-call
+microseconds and calls/second) are printed as JSON.
+
+Usage (from the backend directory):
+    python benchmarks/micro.py --iterations 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn, iterations):
+    for _ in range(min(100, iterations)):
+        fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return time.perf_counter() - started
+
+
+async def timed_async(fn, iterations):
+    for _ in range(min(100, iterations)):
+        await fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await fn()
+    return time.perf_counter() - started
+
+
+def result(elapsed, iterations):
+    return {
+        "iterations": iterations,
+        "per_call_us": round(elapsed / iterations * 1e6, 2),
+        "calls_per_second": round(iterations / elapsed, 1),
+    }
+
+
+def run(iterations):
+    import auth
+    import principal_cache
+    import serialization
+    import users
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from models import Role, User
+    from principal_cache import Principal
+    from starlette.requests import Request
+    from users import UserResponse
+
+    results = {}
+
+    # create_access_token
+    elapsed = timed(lambda: auth.create_access_token(data={"sub": "bench-user"}), iterations)
+    results["create_access_token"] = result(elapsed, iterations)
+
+    # verify_token on a cached principal
+    principal = Principal(id="bench-user", email="bench@example.com", is_active=True, is_verified=True, role_names=["user"])
+    token = auth.create_access_token(data={"sub": principal.id})
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+    request = Request({"type": "http", "method": "GET", "path": "/users/me", "headers": headers, "query_string": b""})
+
+    async def verify():
+        # Keep the entry fresh so every call is a cache hit
+        if principal_cache.cache.get(principal.id) is None:
+            principal_cache.cache.set(principal)
+        await auth.verify_token(request=request, token=token, db=None)
+
+    elapsed = asyncio.run(timed_async(verify, iterations))
+    results["verify_token"] = result(elapsed, iterations)
+
+    # UserResponse serialization
+    user = User(
+        id="bench-user", email="bench@example.com", first_name="Bench", last_name="User",
+        is_active=True, is_verified=True, created_at=datetime.utcnow(), updated_at=datetime.utcnow(),
+        roles=[Role(id=1, name="user")],
+    )
+    elapsed = timed(lambda: UserResponse.from_orm(user).json(), iterations)
+    results["user_response"] = result(elapsed, iterations)
+
+    # Serialization overhead per response: FastAPI's default path vs the compiled one
+    field = create_response_field(name="response", type_=UserResponse)
+
+    async def fastapi_user():
+        JSONResponse(await serialize_response(field=field, response_content=user))
+
+    async def compiled_user():
+        serialization.respond(users.serialize_user(user))
+
+    elapsed = asyncio.run(timed_async(fastapi_user, iterations))
+    results["user_response_fastapi"] = result(elapsed, iterations)
+    elapsed = asyncio.run(timed_async(compiled_user, iterations))
+    results["user_response_compiled"] = result(elapsed, iterations)
+
+    token_body = {"access_token": token, "token_type": "bearer", "user_id": user.id, "email": user.email}
+
+    async def fastapi_token():
+        JSONResponse(await serialize_response(response_content=token_body))
+
+    async def compiled_token():
+        serialization.respond(token_body)
+
+    elapsed = asyncio.run(timed_async(fastapi_token, iterations))
+    results["token_response_fastapi"] = result(elapsed, iterations)
+    elapsed = asyncio.run(timed_async(compiled_token, iterations))
+    results["token_response_compiled"] = result(elapsed, iterations)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        os.environ.setdefault("JWT_KEYS_DIR", os.path.join(tmp, "jwt_keys"))
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        sys.path.insert(0, BACKEND_DIR)
+        import main as app_main  # noqa: F401  (same module setup as the server)
+
+        results = run(args.iterations)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
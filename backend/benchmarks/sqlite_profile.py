@@ -0,0 +1,105 @@
+"""
+Concurrent login throughput on SQLite, with and without the production
+profile (SQLITE_PROFILE=production: WAL, synchronous=NORMAL, busy_timeout,
+cache/mmap pragmas and the single-writer queue).
+
+For each profile a fresh SQLite file is seeded, `main:app` is booted under
+uvicorn, and the `token` scenario from suite.py runs against it: POST /token
+from --concurrency clients, each login verifying a password and committing a
+new refresh token session. Results per profile (requests/second, latency
+percentiles, error statuses; "database is locked" shows up as 500s) are
+printed as JSON.
+
+bcrypt runs at --bcrypt-rounds (12 by default, the app's own default), so a
+profile that holds database connections while passwords are hashed shows up
+as lower throughput and queued logins. Use --bcrypt-rounds 4 to measure the
+database on its own. On a machine with fewer cores than --concurrency, bcrypt
+saturates the CPU and hides most differences, so run it on a host shaped
+like production. Use --workers > 1 to add cross-process write contention,
+which the writer queue can't serialize and busy_timeout has to absorb.
+
+Usage (from the backend directory):
+    python benchmarks/sqlite_profile.py --concurrency 20 --duration 10
+    python benchmarks/sqlite_profile.py --bcrypt-rounds 4
+    python benchmarks/sqlite_profile.py --workers 2 --output /tmp/sqlite-profile.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+import common
+import suite
+
+PROFILES = ("development", "production")
+
+
+def run_profile(profile, args, tmp):
+    database_url = f"sqlite:///{os.path.join(tmp, f'{profile}.db')}"
+    env = suite.server_env(tmp, args)
+    env.update({
+        "SQLITE_PROFILE": profile,
+        # Keep the hashing pool from shedding load before the database does
+        "PASSWORD_HASH_QUEUE_SIZE": str(args.concurrency * 2),
+    })
+    seeded = common.seed_database(database_url, users=args.users, env=env)
+
+    output = open(args.server_log, "a") if args.server_log else subprocess.DEVNULL
+    process, base_url = common.start_server(database_url, common.free_port(), args.workers, output, env)
+    try:
+        return asyncio.run(suite.scenario_token(base_url, args, seeded))
+    finally:
+        process.terminate()
+        process.wait()
+        if args.server_log:
+            output.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="comma-separated subset of: " + ", ".join(PROFILES))
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per profile")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--users", type=int, default=100, help="verified users to log in as")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--server-log", help="append the servers' stdout/stderr to this file")
+    parser.add_argument("--output", help="write the JSON results here as well as to stdout")
+    args = parser.parse_args()
+
+    profiles = [name for name in args.profiles.split(",") if name]
+    unknown = set(profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f"unknown profiles: {', '.join(sorted(unknown))}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in profiles:
+            print(f"Running token with SQLITE_PROFILE={profile}...", file=sys.stderr)
+            results[profile] = run_profile(profile, args, tmp)
+
+    report = {
+        "meta": {
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "workers": args.workers,
+            "bcrypt_rounds": args.bcrypt_rounds,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Benchmark suite for the auth API.
+
+Boots `main:app` under uvicorn against a fresh database and runs concurrent
+load against each scenario in turn, then runs the in-process
+micro-benchmarks (benchmarks/micro.py, which also report the per-response
+serialization cost of the default and compiled JSON paths):
+
+    token          POST /token (bcrypt verify + session insert)
+    users_me       GET /users/me with a bearer token
+    refresh_token  POST /refresh-token, each worker rotating its own session
+    register       POST /users/ with unique emails
+    verify_email   POST /users/verify-email, one pre-minted token per request
+
+The database is a temporary SQLite file by default. --database postgres
+starts a throwaway postgres:15 container (needs docker), or pass
+--database-url to use an existing server. The rate limiter is disabled for the
+run and outgoing email goes to a closed local port, so neither skews results.
+
+Results are printed (or written with --output) as JSON. With --baseline, each
+scenario's requests/second and p95 latency and each micro-benchmark's per-call
+time are compared against a previous run; any that is worse by more than
+--threshold (a fraction) is reported and the exit status is 1.
+
+Usage (from the backend directory):
+    python benchmarks/suite.py --output /tmp/bench-main.json
+    python benchmarks/suite.py --baseline /tmp/bench-main.json --threshold 0.15
+    python benchmarks/suite.py --database postgres --scenarios token,users_me
+
+Baselines are only meaningful on the host they were recorded on; record one
+from the base revision and compare on the same machine.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import uuid
+
+import httpx
+
+import common
+
+SCENARIOS = ("token", "users_me", "refresh_token", "register", "verify_email")
+
+
+async def login(client, email=common.BENCH_EMAIL):
+    response = await client.post("/token", data={"username": email, "password": common.BENCH_PASSWORD})
+    response.raise_for_status()
+    return response
+
+
+async def scenario_token(base_url, args, seeded):
+    emails = seeded["emails"]
+    states = [{"i": i} for i in range(args.concurrency)]
+
+    async def send(client, state):
+        state["i"] += args.concurrency
+        email = emails[state["i"] % len(emails)]
+        return await client.post("/token", data={"username": email, "password": common.BENCH_PASSWORD})
+
+    return await common.run_load(base_url, send, args.concurrency, args.duration, states)
+
+
+async def scenario_users_me(base_url, args, seeded):
+    async with httpx.AsyncClient(base_url=base_url, cookies=common.no_cookies()) as client:
+        token = (await login(client)).json()["access_token"]
+
+    async def send(client, state):
+        return await client.get("/users/me")
+
+    return await common.run_load(
+        base_url, send, args.concurrency, args.duration, headers={"Authorization": f"Bearer {token}"},
+    )
+
+
+async def scenario_refresh_token(base_url, args, seeded):
+    # One session per worker, created before timing starts
+    async with httpx.AsyncClient(base_url=base_url, cookies=common.no_cookies(), timeout=60) as client:
+        states = [{"refresh_token": (await login(client)).cookies["refresh_token"]} for _ in range(args.concurrency)]
+
+    async def send(client, state):
+        response = await client.post("/refresh-token", json={"refresh_token": state["refresh_token"]})
+        if response.is_success:
+            state["refresh_token"] = response.cookies["refresh_token"]
+        return response
+
+    return await common.run_load(base_url, send, args.concurrency, args.duration, states)
+
+
+async def scenario_register(base_url, args, seeded):
+    run_id = uuid.uuid4().hex[:8]
+    counter = iter(range(10 ** 9))
+
+    async def send(client, state):
+        email = f"bench-register-{run_id}-{next(counter)}@example.com"
+        return await client.post("/users/", json={"email": email, "password": common.BENCH_PASSWORD})
+
+    return await common.run_load(base_url, send, args.concurrency, args.duration)
+
+
+async def scenario_verify_email(base_url, args, seeded):
+    tokens = iter(seeded["verification_tokens"])
+
+    async def send(client, state):
+        return await client.post("/users/verify-email", json={"token": next(tokens)})
+
+    return await common.run_load(
+        base_url, send, args.concurrency, args.duration, max_requests=len(seeded["verification_tokens"]),
+    )
+
+
+SCENARIO_FUNCTIONS = {
+    "token": scenario_token,
+    "users_me": scenario_users_me,
+    "refresh_token": scenario_refresh_token,
+    "register": scenario_register,
+    "verify_email": scenario_verify_email,
+}
+
+
+def run_micro(iterations, env):
+    output = subprocess.run(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "micro.py"), "--iterations", str(iterations)],
+        cwd=common.BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def server_env(tmp, args):
+    env = {
+        "JWT_KEYS_DIR": os.path.join(tmp, "jwt_keys"),
+        "RATE_LIMIT_ENABLED": "false",
+        "QUERY_STATS_HEADERS": "false",
+        "LOG_LEVEL": "WARNING",
+        # Nothing listens here, so the outbox fails fast in the background
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(common.free_port()),
+        "SMTP_SECURITY": "none",
+        "SMTP_USERNAME": "",
+    }
+    if args.bcrypt_rounds:
+        env["PASSWORD_BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    return env
+
+
+def run_suite(database_url, args, tmp):
+    env = server_env(tmp, args)
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unverified = args.verify_tokens if "verify_email" in scenarios else 0
+    seeded = common.seed_database(database_url, users=args.users, unverified=unverified, env=env)
+
+    output = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    process, base_url = common.start_server(database_url, common.free_port(), args.workers, output, env)
+    results = {}
+    try:
+        for name in scenarios:
+            print(f"Running {name}...", file=sys.stderr)
+            results[name] = asyncio.run(SCENARIO_FUNCTIONS[name](base_url, args, seeded))
+    finally:
+        process.terminate()
+        process.wait()
+        if args.server_log:
+            output.close()
+
+    if args.micro_iterations:
+        print("Running micro-benchmarks...", file=sys.stderr)
+        results["micro"] = run_micro(args.micro_iterations, dict(os.environ, **env, DATABASE_URL=database_url))
+    return results
+
+
+# Baseline comparison: (path into the results, True if higher is better)
+def comparable_metrics(results):
+    for name, result in results.items():
+        if name == "micro":
+            for bench, values in result.items():
+                yield f"micro.{bench}.per_call_us", values["per_call_us"], False
+        else:
+            yield f"{name}.requests_per_second", result["requests_per_second"], True
+            yield f"{name}.latency_ms.p95", result["latency_ms"]["p95"], False
+
+
+def compare(results, baseline, threshold):
+    """Returns (rows, regressions); each row is (metric, baseline, current, relative change)."""
+    previous = {metric: value for metric, value, _ in comparable_metrics(baseline.get("results", {}))}
+    rows, regressions = [], []
+    for metric, value, higher_is_better in comparable_metrics(results):
+        before = previous.get(metric)
+        if not before or value is None:
+            continue
+        change = (value - before) / before
+        rows.append((metric, before, value, change))
+        worse = -change if higher_is_better else change
+        if worse > threshold:
+            regressions.append(metric)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--database", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--database-url", help="use this database instead of a temporary one")
+    parser.add_argument("--users", type=int, default=100, help="verified users seeded for the login scenarios")
+    parser.add_argument("--verify-tokens", type=int, default=2000, help="unverified users seeded for verify_email")
+    parser.add_argument("--bcrypt-rounds", type=int, help="PASSWORD_BCRYPT_ROUNDS for the run (default: the configured cost)")
+    parser.add_argument("--micro-iterations", type=int, default=20000, help="0 skips the micro-benchmarks")
+    parser.add_argument("--server-log", help="write the server's stdout/stderr to this file")
+    parser.add_argument("--output", help="write the JSON results here as well as to stdout")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative regression (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS) - {""}
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.ExitStack() as stack:
+        if args.database_url:
+            database_url = args.database_url
+        elif args.database == "postgres":
+            database_url = stack.enter_context(common.postgres_container())
+        else:
+            database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        results = run_suite(database_url, args, tmp)
+
+    report = {
+        "meta": {
+            "database": database_url.split(":", 1)[0],
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "workers": args.workers,
+            "bcrypt_rounds": args.bcrypt_rounds,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(results, baseline, args.threshold)
+        report["comparison"] = {
+            "baseline": args.baseline,
+            "threshold": args.threshold,
+            "changes": {metric: {"baseline": before, "current": value, "change": round(change, 4)} for metric, before, value, change in rows},
+            "regressions": regressions,
+        }
+        for metric, before, value, change in rows:
+            flag = "  REGRESSION" if metric in regressions else ""
+            print(f"{metric:45} {before:>12} -> {value:>12} ({change:+.1%}){flag}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.baseline and report["comparison"]["regressions"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
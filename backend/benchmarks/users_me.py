@@ -0,0 +1,71 @@
+"""
+Requests/sec benchmark for GET /users/me.
+
+Boots the API with uvicorn against a throwaway SQLite database (or the
+DATABASE_URL you pass in), seeds one user, logs in once and then hammers
+/users/me with concurrent clients. Results are printed as JSON.
+
+Usage (from the backend directory):
+    python benchmarks/users_me.py --concurrency 50 --duration 10
+
+To compare two revisions, run it once on each checkout and compare the
+`requests_per_second` values. Server output is discarded by default; pass
+--server-log to write it to a file, which includes the cost of log I/O the
+way a real deployment pays it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import tempfile
+
+import httpx
+
+import common
+
+
+async def run_load(base_url, token, concurrency, duration):
+    async def send(client, state):
+        return await client.get("/users/me")
+
+    return await common.run_load(
+        base_url, send, concurrency, duration, headers={"Authorization": f"Bearer {token}"},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--server-log", help="write the server's stdout/stderr to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        common.seed_database(database_url)
+        output = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+        process, base_url = common.start_server(database_url, common.free_port(), args.workers, output)
+        try:
+            login = httpx.post(f"{base_url}/token", data={"username": common.BENCH_EMAIL, "password": common.BENCH_PASSWORD})
+            login.raise_for_status()
+            result = asyncio.run(run_load(base_url, login.json()["access_token"], args.concurrency, args.duration))
+        finally:
+            process.terminate()
+            process.wait()
+            if args.server_log:
+                output.close()
+
+    result.update({
+        "endpoint": "GET /users/me",
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "database": database_url.split(":", 1)[0],
+    })
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,23 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import asyncio
+import itertools
+import logging
 import os
+import time
+from datetime import datetime
 from dotenv import load_dotenv
 
+import metrics
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Use SQLite for local development
 # Set DATABASE_URL=sqlite:///./test.db by default
 database_url = os.getenv("DATABASE_URL", "sqlite:///./test.db")
@@ -17,10 +29,379 @@ if database_url.startswith("sqlite"):
 
 SQLALCHEMY_DATABASE_URL = database_url
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
+# Connection pool settings, applied to every engine (primary and replicas)
+# DB_POOL_SIZE / DB_MAX_OVERFLOW: connections kept open, and extra ones opened
+#   (then closed again) under load
+# DB_POOL_TIMEOUT: seconds a checkout may wait for a free connection before the
+#   request fails with 503; short, so saturation shows up as errors instead of
+#   requests silently queueing
+# DB_POOL_RECYCLE: replace connections older than this many seconds (-1 never);
+#   keep it below any server or proxy idle timeout
+# DB_POOL_PRE_PING: test connections on checkout and transparently replace ones
+#   the server has closed
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# SQLite production profile
+# SQLITE_PROFILE: "production" applies the pragmas below to every SQLite
+#   connection and funnels this process's writes through one writer at a time;
+#   "development" (the default) leaves SQLite's defaults alone
+# SQLITE_BUSY_TIMEOUT_MS: how long a write waits for the database lock (held by
+#   another process, or by this process's writer queue) before giving up
+# SQLITE_CACHE_SIZE_KB: page cache per connection
+# SQLITE_MMAP_SIZE_MB: how much of the file is read through memory-mapped I/O
+# WAL lets readers run while a write is in progress, and synchronous=NORMAL is
+# durable against application crashes (a power loss can drop the last commits).
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "development").lower()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+    f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+    f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+    "PRAGMA temp_store=MEMORY",
+)
+
+def sqlite_production(url) -> bool:
+    url = make_url(url)
+    return SQLITE_PROFILE == "production" and url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+def configure_sqlite(sync_engine):
+    """Apply the production pragmas to each new connection of a SQLite engine."""
+    if sqlite_production(sync_engine.url):
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
+    return sync_engine
+
+def pool_args(url: str) -> dict:
+    """Queue pool arguments for an engine; in-memory SQLite keeps its single-connection pool."""
+    if ":memory:" in url:
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+# Async drivers used by the request path for each backend
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(url: str) -> str:
+    """Translate a sync DATABASE_URL into the matching async driver URL."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+# ASYNC_DATABASE_URL can be set explicitly, otherwise it is derived from DATABASE_URL
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or get_async_database_url(database_url)
+
+# Sync engine, used for schema creation and scripts
+engine = configure_sqlite(create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args, **pool_args(SQLALCHEMY_DATABASE_URL)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine, used by all request handlers. Objects stay usable after commit
+# (expire_on_commit=False) since attribute refreshes can't be lazy-loaded here.
+class PoolTimeout(exc.TimeoutError):
+    """No connection became free within DB_POOL_TIMEOUT; surfaced as a 503."""
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that reports how long each checkout waited for a connection,
+    how many are waiting right now, and how many gave up.
+    """
+
+    # Value of the metric's engine label; replicas get their own subclass
+    engine_label = "primary"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            return super()._do_get()
+        except exc.TimeoutError as error:
+            self.timeouts += 1
+            raise PoolTimeout(
+                f"No database connection free on {self.engine_label} within {self._timeout:g}s "
+                f"({self.checkedout()} checked out, {self.waiting - 1} others waiting)"
+            ) from error
+        finally:
+            self.waiting -= 1
+            elapsed = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_seconds += elapsed
+            metrics.DB_POOL_CHECKOUT_SECONDS.observe(elapsed, self.engine_label)
+
+    def stats(self):
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            # Connections open beyond pool_size (negative while the pool is still filling)
+            "overflow": self.overflow(),
+            "max_overflow": self._max_overflow,
+            "waiting": self.waiting,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+        }
+
+def create_request_engine(url: str, label: str = "primary", **pool_overrides):
+    """Async engine for request handlers, pooled and timed under `label`."""
+    engine_args = pool_args(url)
+    if engine_args:
+        engine_args.update(pool_overrides)
+        # Also replaces aiosqlite's default NullPool, which opens a new connection
+        # (and thread) per session; keep connections pooled like the sync engine does
+        engine_args["poolclass"] = type(f"TimedPool[{label}]", (TimedAsyncAdaptedQueuePool,), {"engine_label": label})
+    request_engine = create_async_engine(url, **engine_args)
+    configure_sqlite(request_engine.sync_engine)
+    return request_engine
+
+def request_engines():
+    """(label, async engine) for the primary, the SQLite writer and every replica."""
+    engines = [("primary", async_engine)]
+    if writer_engine is not None:
+        engines.append(("writer", writer_engine))
+    return engines + [(replica.name, replica.engine) for replica in replicas.replicas]
+
+def pool_stats():
+    """Pool state of each request engine, keyed by label."""
+    return {
+        label: engine.pool.stats() if hasattr(engine.pool, "stats") else {"pool": type(engine.pool).__name__}
+        for label, engine in request_engines()
+    }
+
+async_engine = create_request_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+
+# Single SQLite writer. SQLite runs one write transaction at a time, so under
+# the production profile writes get an engine with exactly one connection: a
+# session moves to it at its first write (see RoutingSession) and holds it
+# until the transaction ends. This process's writers queue for it in order
+# instead of contending on the file lock, while reads keep running on
+# async_engine's connections alongside (WAL). A write that waits longer than
+# SQLITE_BUSY_TIMEOUT_MS fails with PoolTimeout, i.e. a 503.
+SERIALIZE_WRITES = sqlite_production(ASYNC_SQLALCHEMY_DATABASE_URL)
+writer_engine = None
+if SERIALIZE_WRITES:
+    writer_engine = create_request_engine(
+        ASYNC_SQLALCHEMY_DATABASE_URL, label="writer",
+        pool_size=1, max_overflow=0, pool_timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+    )
+
+# Read replicas
+# DATABASE_REPLICA_URLS: comma-separated URLs (same form as DATABASE_URL) of
+#   read replicas; read-only queries are spread across the healthy ones
+# REPLICA_HEALTH_CHECK_SECONDS: how often each replica is probed
+# REPLICA_MAX_LAG_SECONDS: PostgreSQL replicas further behind the primary than
+#   this are treated as unhealthy; 0 disables the lag check
+# Replication is asynchronous, so a request can't read its own earlier writes
+# from a replica; sessions switch to the primary for good once they write
+# (see RoutingSession). Handlers that write based on what they read use
+# get_primary_db, and background jobs reading security or queue state call
+# use_primary(). Locally, a copy of the SQLite file (or a second database
+# server) stands in for a replica.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_HEALTH_CHECK_SECONDS = float(os.getenv("REPLICA_HEALTH_CHECK_SECONDS", "5"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+
+# Seconds of replay lag; 0 when the replica has replayed everything it received
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = create_request_engine(get_async_database_url(url), label=name)
+        self.is_postgres = self.engine.dialect.name == "postgresql"
+        # Unhealthy until the first check passes
+        self.healthy = False
+        self.lag_seconds = None
+        self.last_error = None
+        self.checked_at = None
+
+    async def check(self):
+        try:
+            async with self.engine.connect() as conn:
+                if self.is_postgres and REPLICA_MAX_LAG_SECONDS > 0:
+                    self.lag_seconds = float((await conn.execute(POSTGRES_LAG_QUERY)).scalar() or 0)
+                else:
+                    await conn.execute(text("SELECT 1"))
+            if self.lag_seconds is not None and self.lag_seconds > REPLICA_MAX_LAG_SECONDS:
+                self.last_error = f"replication lag {self.lag_seconds:.1f}s"
+                healthy = False
+            else:
+                self.last_error = None
+                healthy = True
+        except Exception as exc:
+            self.last_error = str(exc)
+            healthy = False
+        if healthy != self.healthy:
+            log = logger.info if healthy else logger.warning
+            log("Read replica %s is %s%s", self.name, "healthy" if healthy else "unhealthy", f": {self.last_error}" if self.last_error else "")
+        self.healthy = healthy
+        self.checked_at = datetime.utcnow()
+
+class ReplicaSet:
+    """The configured read replicas, health-checked in the background."""
+
+    def __init__(self, urls):
+        self.replicas = [Replica(f"replica-{i}", url) for i, url in enumerate(urls, 1)]
+        self._healthy = []
+        self._cycle = itertools.cycle([None])
+        self._task = None
+
+        # Counters exposed through stats(): sessions given a replica, and
+        # sessions that fell back to the primary because none was healthy
+        self.replica_sessions = 0
+        self.fallbacks = 0
+
+    def choose(self):
+        """Sync engine of the next healthy replica, round robin; None means use the primary."""
+        replica = next(self._cycle)
+        if replica is None:
+            self.fallbacks += 1
+            return None
+        self.replica_sessions += 1
+        return replica.engine.sync_engine
+
+    async def check(self):
+        timeout = max(1.0, REPLICA_HEALTH_CHECK_SECONDS)
+        await asyncio.gather(*(asyncio.wait_for(replica.check(), timeout) for replica in self.replicas), return_exceptions=True)
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if healthy != self._healthy:
+            self._healthy = healthy
+            self._cycle = itertools.cycle(healthy or [None])
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(REPLICA_HEALTH_CHECK_SECONDS)
+            try:
+                await self.check()
+            except Exception as exc:
+                logger.error("Read replica health check failed: %s", exc)
+
+    async def start(self):
+        """Check every replica once, then keep checking in the background."""
+        if self.replicas and self._task is None:
+            await self.check()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stats(self):
+        return {
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "lag_seconds": replica.lag_seconds,
+                    "last_error": replica.last_error,
+                    "checked_at": replica.checked_at.isoformat() if replica.checked_at else None,
+                }
+                for replica in self.replicas
+            ],
+            "replica_sessions": self.replica_sessions,
+            "fallbacks": self.fallbacks,
+        }
+
+replicas = ReplicaSet(DATABASE_REPLICA_URLS)
+
+class RoutingSession(Session):
+    """
+    Session that sends read-only statements to a read replica. Writes (and
+    SELECT ... FOR UPDATE) go to the primary, and once a session has written
+    or has pending changes it stays on the primary, so reads that follow a
+    write see it. So does an explicit `connection()` call, since the caller
+    may write through the raw connection. A session sticks to the replica it
+    first picked.
+
+    Under the SQLite production profile, "the primary" is split in two: reads
+    (pinned sessions included) use async_engine's shared pool, and only a
+    transaction's first write takes the single writer connection. The
+    transaction keeps the writer, reads included so they see its writes,
+    until it commits or rolls back. Password hashing done before a request's
+    first write therefore never holds the writer.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.use_primary = not replicas.replicas
+        self._replica = None
+        # The current transaction holds the SQLite writer
+        self._writing = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        writes = (
+            clause is None
+            or self._flushing
+            or getattr(clause, "is_dml", False)
+            or getattr(clause, "_for_update_arg", None) is not None
+        )
+        if writes or not self._is_clean():
+            self.use_primary = True
+        if writer_engine is not None and (writes or self._writing):
+            self._writing = True
+            return writer_engine.sync_engine
+        if self.use_primary:
+            return async_engine.sync_engine
+        if self._replica is None:
+            replica = replicas.choose()
+            self._replica = replica or async_engine.sync_engine
+        return self._replica
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _release_writer(session, transaction):
+    # The writer connection goes back to its pool with the outermost transaction
+    if transaction.parent is None:
+        session._writing = False
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+def use_primary(db: AsyncSession):
+    """Send every remaining statement in the session to the primary."""
+    db.sync_session.use_primary = True
+    return db
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -28,3 +409,14 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Async dependency
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Async dependency for endpoints that must not read from a replica, e.g.
+# read-then-write flows where a lagging replica could allow a replay
+async def get_primary_db():
+    async with AsyncSessionLocal() as db:
+        yield use_primary(db)
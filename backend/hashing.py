@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from dotenv import load_dotenv
+
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Hash settings (see benchmarks/hash_calibration.py to pick values for a host)
+# PASSWORD_HASH_SCHEMES: passlib schemes, comma-separated; the first hashes new
+#   passwords, the others are still verified and get rehashed on login
+# PASSWORD_BCRYPT_ROUNDS: bcrypt cost (log2 rounds)
+# PASSWORD_ARGON2_*: argon2 parameters (needs argon2-cffi), memory in KiB
+# Hashes made with other parameters are upgraded on the user's next login.
+PASSWORD_HASH_SCHEMES = [scheme.strip() for scheme in os.getenv("PASSWORD_HASH_SCHEMES", "bcrypt").split(",") if scheme.strip()]
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv("PASSWORD_ARGON2_TIME_COST", "3"))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv("PASSWORD_ARGON2_MEMORY_COST", "65536"))
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv("PASSWORD_ARGON2_PARALLELISM", "4"))
+
+
+def build_context(schemes=None, bcrypt_rounds=None, argon2_time_cost=None, argon2_memory_cost=None, argon2_parallelism=None):
+    """
+    CryptContext for the given parameters (defaults from the environment).
+    min/max rounds are pinned to the configured cost so needs_update() flags
+    hashes made with any other cost, higher or lower.
+    """
+    schemes = schemes or PASSWORD_HASH_SCHEMES
+    bcrypt_rounds = bcrypt_rounds or PASSWORD_BCRYPT_ROUNDS
+    argon2_time_cost = argon2_time_cost or PASSWORD_ARGON2_TIME_COST
+    settings = {}
+    if "bcrypt" in schemes:
+        settings.update(
+            bcrypt__default_rounds=bcrypt_rounds,
+            bcrypt__min_rounds=bcrypt_rounds,
+            bcrypt__max_rounds=bcrypt_rounds,
+        )
+    if "argon2" in schemes:
+        settings.update(
+            argon2__rounds=argon2_time_cost,
+            argon2__min_rounds=argon2_time_cost,
+            argon2__max_rounds=argon2_time_cost,
+            argon2__memory_cost=argon2_memory_cost or PASSWORD_ARGON2_MEMORY_COST,
+            argon2__parallelism=argon2_parallelism or PASSWORD_ARGON2_PARALLELISM,
+        )
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
+
+# Password hashing context, shared by the API process and the pool workers
+pwd_context = build_context()
+
+# Pool settings
+# PASSWORD_HASH_WORKERS: number of worker processes doing bcrypt work
+# PASSWORD_HASH_QUEUE_SIZE: how many jobs may wait for a free worker before
+# new ones are rejected with a 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", str(PASSWORD_HASH_WORKERS * 4)))
+PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", "1"))
+# Bulk hashing (user import) sends passwords in chunks of PASSWORD_HASH_BULK_CHUNK
+# and keeps at most PASSWORD_HASH_BULK_CONCURRENCY chunks in the pool, leaving
+# the remaining workers to interactive logins
+PASSWORD_HASH_BULK_CHUNK = int(os.getenv("PASSWORD_HASH_BULK_CHUNK", "32"))
+PASSWORD_HASH_BULK_CONCURRENCY = int(os.getenv("PASSWORD_HASH_BULK_CONCURRENCY", str(max(1, PASSWORD_HASH_WORKERS - 1))))
+
+
+# Worker-side functions. These run inside the pool processes, so they must be
+# plain module-level functions. Each one returns its own service time so the
+# caller can split the total latency into queue wait and bcrypt time.
+def _hash_job(password):
+    started = time.perf_counter()
+    hashed = pwd_context.hash(password)
+    return hashed, time.perf_counter() - started
+
+def _hash_many_job(passwords):
+    started = time.perf_counter()
+    hashed = [pwd_context.hash(password) for password in passwords]
+    return hashed, time.perf_counter() - started
+
+def _verify_job(password, hashed_password):
+    started = time.perf_counter()
+    result = pwd_context.verify(password, hashed_password)
+    return result, time.perf_counter() - started
+
+def _verify_and_update_job(password, hashed_password):
+    started = time.perf_counter()
+    result = pwd_context.verify_and_update(password, hashed_password)
+    return result, time.perf_counter() - started
+
+
+# Metric label for each job type
+JOB_OPERATIONS = {
+    _hash_job: "hash",
+    _hash_many_job: "hash_bulk",
+    _verify_job: "verify",
+    _verify_and_update_job: "verify",
+}
+
+
+class HashingPool:
+    """
+    Process pool for password hashing with admission control.
+
+    At most `workers + queue_size` jobs are accepted at a time; anything beyond
+    that is rejected immediately instead of piling up behind bcrypt.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+        # Counters exposed through stats()
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._service_total = 0.0
+
+    @property
+    def capacity(self):
+        return self.workers + self.queue_size
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                # Use spawn so the workers don't inherit the event loop, open
+                # sockets or threads of the API process
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                logger.info(
+                    "Password hashing pool started with %s workers, queue size %s",
+                    self.workers,
+                    self.queue_size,
+                )
+        return self._executor
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, please try again shortly",
+                    headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+                )
+            self._in_flight += 1
+            self._submitted += 1
+
+    def _release(self, elapsed, service_time, operation=None):
+        if service_time is not None:
+            metrics.PASSWORD_HASH_SECONDS.observe(service_time, operation)
+            metrics.PASSWORD_HASH_WAIT_SECONDS.observe(max(0.0, elapsed - service_time), operation)
+        with self._lock:
+            self._in_flight -= 1
+            if service_time is not None:
+                wait = max(0.0, elapsed - service_time)
+                self._completed += 1
+                self._wait_total += wait
+                self._service_total += service_time
+                if wait > self._wait_max:
+                    self._wait_max = wait
+
+    def submit(self, fn, *args):
+        """Submit a job and return a concurrent future resolving to (result, service_time)."""
+        self._admit()
+        submitted_at = time.perf_counter()
+        try:
+            future = self.start().submit(fn, *args)
+        except Exception:
+            self._release(0.0, None)
+            raise
+
+        def _done(f):
+            elapsed = time.perf_counter() - submitted_at
+            service_time = None
+            if not f.cancelled() and f.exception() is None:
+                service_time = f.result()[1]
+            self._release(elapsed, service_time, JOB_OPERATIONS.get(fn, fn.__name__))
+
+        future.add_done_callback(_done)
+        return future
+
+    async def run(self, fn, *args):
+        """Run a job from a coroutine without blocking the event loop."""
+        result, _ = await asyncio.wrap_future(self.submit(fn, *args))
+        return result
+
+    def stats(self):
+        with self._lock:
+            in_flight = self._in_flight
+            completed = self._completed
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": in_flight,
+                "queue_depth": max(0, in_flight - self.workers),
+                "submitted": self._submitted,
+                "completed": completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_total / completed * 1000, 3) if completed else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 3),
+                "avg_service_ms": round(self._service_total / completed * 1000, 3) if completed else 0.0,
+            }
+
+
+pool = HashingPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE)
+
+# Public helpers
+async def verify_password_async(plain_password, hashed_password):
+    return await pool.run(_verify_job, plain_password, hashed_password)
+
+async def verify_and_update_async(plain_password, hashed_password):
+    """
+    Returns (verified, new_hash). new_hash is set when the stored hash uses an
+    outdated scheme or cost and should be replaced.
+    """
+    return await pool.run(_verify_and_update_job, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await pool.run(_hash_job, password)
+
+async def hash_passwords_bulk(passwords):
+    """
+    Hash many passwords in parallel, preserving order. Waits for room in the
+    pool instead of failing when interactive traffic has filled it.
+    """
+    semaphore = asyncio.Semaphore(max(1, PASSWORD_HASH_BULK_CONCURRENCY))
+    
+    async def run_chunk(chunk):
+        async with semaphore:
+            while True:
+                try:
+                    return await pool.run(_hash_many_job, chunk)
+                except HTTPException:
+                    await asyncio.sleep(PASSWORD_HASH_RETRY_AFTER_SECONDS)
+    
+    size = max(1, PASSWORD_HASH_BULK_CHUNK)
+    chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    results = await asyncio.gather(*(run_chunk(chunk) for chunk in chunks))
+    return [hashed for chunk in results for hashed in chunk]
@@ -0,0 +1,299 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk, jwt
+from jose.exceptions import JWTError
+from dotenv import load_dotenv
+
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Signing settings
+# JWT_ALGORITHM: RS256 or ES256
+# JWT_KEYS_DIR: directory holding one private key per file, named <kid>.pem.
+#   Share it between workers/replicas so they all sign with the same keys.
+# JWT_KEY_ROTATION_DAYS: how long a key signs tokens before the next one takes
+#   over (0 disables automatic rotation, e.g. when keys are provisioned externally)
+# JWT_KEY_PREPUBLISH_HOURS: how long a new key is published in the JWKS before
+#   it starts signing, so verifiers can pick it up ahead of time
+# JWT_KEYS_RELOAD_SECONDS: how often the key directory is re-read
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "RS256")
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "./jwt_keys")
+JWT_KEY_ROTATION_DAYS = float(os.getenv("JWT_KEY_ROTATION_DAYS", "30"))
+JWT_KEY_PREPUBLISH_HOURS = float(os.getenv("JWT_KEY_PREPUBLISH_HOURS", "24"))
+JWT_KEYS_RELOAD_SECONDS = float(os.getenv("JWT_KEYS_RELOAD_SECONDS", "60"))
+
+# Retired keys stay verifiable (and published) for the lifetime of the tokens
+# they signed; keep in sync with auth.ACCESS_TOKEN_EXPIRE_MINUTES
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+SUPPORTED_ALGORITHMS = ("RS256", "ES256")
+KID_TIME_FORMAT = "%Y%m%d%H%M%S"
+
+
+def _generate_private_key_pem(algorithm: str) -> bytes:
+    if algorithm == "RS256":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == "ES256":
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        raise ValueError(f"Unsupported JWT algorithm '{algorithm}', expected one of {SUPPORTED_ALGORITHMS}")
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+
+
+def _kid_created_at(kid: str) -> datetime:
+    """Key ids start with their creation time, so every worker derives the same schedule."""
+    return datetime.strptime(kid.split("-", 1)[0], KID_TIME_FORMAT)
+
+
+class SigningKey:
+    """A parsed key pair. Parsing happens once per kid, never per request."""
+
+    def __init__(self, kid: str, pem: bytes, algorithm: str):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.created_at = _kid_created_at(kid)
+        self.private_key = jwk.construct(pem, algorithm)
+        self.public_key = self.private_key.public_key()
+        self.public_jwk = dict(self.public_key.to_dict(), kid=kid, use="sig", alg=algorithm)
+
+
+class KeyRing:
+    """
+    Key set loaded from JWT_KEYS_DIR, with a rotation schedule:
+
+    - a key created at C starts signing at C + prepublish (the very first key
+      signs immediately),
+    - the next key is generated once the active key has signed for
+      rotation - prepublish, so it is published before it is used,
+    - a key is dropped once its successor has been signing for longer than
+      the access token lifetime.
+    """
+
+    def __init__(self, keys_dir: str, algorithm: str, rotation: timedelta, prepublish: timedelta, token_lifetime: timedelta):
+        self.keys_dir = keys_dir
+        self.algorithm = algorithm
+        self.rotation = rotation
+        self.prepublish = prepublish
+        self.token_lifetime = token_lifetime
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._signing_key = None
+        self._verification_keys = {}
+        self._jwks = b'{"keys": []}'
+        self._next_reload = 0.0
+        self._last_forced_reload = 0.0
+
+    # Schedule
+    def _activation_times(self, keys):
+        ordered = sorted(keys, key=lambda k: k.created_at)
+        activations = {}
+        for index, key in enumerate(ordered):
+            activations[key.kid] = key.created_at if index == 0 else key.created_at + self.prepublish
+        return ordered, activations
+
+    def _compute_sets(self, now: datetime):
+        ordered, activations = self._activation_times(self._keys.values())
+        active = [key for key in ordered if activations[key.kid] <= now]
+        signing_key = active[-1] if active else None
+
+        verification_keys = {}
+        for index, key in enumerate(ordered):
+            successor = ordered[index + 1] if index + 1 < len(ordered) else None
+            if successor is not None and activations[successor.kid] + self.token_lifetime < now:
+                continue
+            verification_keys[key.kid] = key
+        return signing_key, verification_keys, activations
+
+    # Loading
+    def _read_dir(self):
+        if not os.path.isdir(self.keys_dir):
+            return
+        for name in os.listdir(self.keys_dir):
+            if not name.endswith(".pem"):
+                continue
+            kid = name[: -len(".pem")]
+            if kid in self._keys:
+                continue
+            try:
+                with open(os.path.join(self.keys_dir, name), "rb") as key_file:
+                    self._keys[kid] = SigningKey(kid, key_file.read(), self.algorithm)
+            except Exception as exc:
+                logger.error("Could not load JWT key %s: %s", name, exc)
+
+    def reload(self):
+        with self._lock:
+            self._read_dir()
+            # Forget keys whose files were removed
+            if os.path.isdir(self.keys_dir):
+                present = {name[: -len(".pem")] for name in os.listdir(self.keys_dir) if name.endswith(".pem")}
+                for kid in list(self._keys):
+                    if kid not in present:
+                        del self._keys[kid]
+            signing_key, verification_keys, _ = self._compute_sets(datetime.utcnow())
+            self._signing_key = signing_key
+            self._verification_keys = verification_keys
+            self._jwks = json.dumps({"keys": [key.public_jwk for key in verification_keys.values()]}).encode()
+            self._next_reload = time.monotonic() + JWT_KEYS_RELOAD_SECONDS
+
+    def _maybe_reload(self):
+        if time.monotonic() >= self._next_reload or self._signing_key is None:
+            self.reload()
+
+    # Rotation
+    def _generate_key(self, now: datetime):
+        os.makedirs(self.keys_dir, exist_ok=True)
+        kid = f"{now.strftime(KID_TIME_FORMAT)}-{secrets.token_hex(4)}"
+        # Write to a temp file and rename, so other workers never read a partial key
+        tmp_path = os.path.join(self.keys_dir, f".{kid}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as key_file:
+            key_file.write(_generate_private_key_pem(self.algorithm))
+        os.rename(tmp_path, os.path.join(self.keys_dir, f"{kid}.pem"))
+        logger.info("Generated JWT signing key %s", kid)
+
+    def _acquire_rotation_lock(self):
+        """Cross-process lock so only one worker generates the next key."""
+        os.makedirs(self.keys_dir, exist_ok=True)
+        lock_path = os.path.join(self.keys_dir, ".rotation.lock")
+        try:
+            # Break locks left behind by a crashed process
+            if time.time() - os.path.getmtime(lock_path) > 60:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+            return lock_path
+        except FileExistsError:
+            return None
+
+    def _needs_new_key(self, now: datetime):
+        if not self._keys:
+            return True
+        if self.rotation <= timedelta(0):
+            return False
+        newest = max(self._keys.values(), key=lambda k: k.created_at)
+        _, activations = self._activation_times(self._keys.values())
+        return activations[newest.kid] + self.rotation - self.prepublish <= now
+
+    def _prune(self, now: datetime):
+        """Delete key files that no longer verify any live token."""
+        _, verification_keys, _ = self._compute_sets(now)
+        for kid in list(self._keys):
+            if kid not in verification_keys:
+                try:
+                    os.remove(os.path.join(self.keys_dir, f"{kid}.pem"))
+                    logger.info("Removed retired JWT signing key %s", kid)
+                except OSError:
+                    pass
+                del self._keys[kid]
+
+    def maintain(self):
+        """Generate the next key when the schedule calls for it and drop retired ones."""
+        self.reload()
+        now = datetime.utcnow()
+        with self._lock:
+            needs_key = self._needs_new_key(now)
+        if needs_key:
+            lock_path = self._acquire_rotation_lock()
+            if lock_path is not None:
+                try:
+                    # Another worker may have rotated in the meantime
+                    with self._lock:
+                        self._read_dir()
+                        if self._needs_new_key(now):
+                            self._generate_key(now)
+                finally:
+                    os.remove(lock_path)
+            elif not self._keys:
+                # Another worker is creating the very first key; wait for it
+                deadline = time.monotonic() + 10
+                while self._signing_key is None and time.monotonic() < deadline:
+                    time.sleep(0.1)
+                    self.reload()
+        if self.rotation > timedelta(0):
+            with self._lock:
+                self._read_dir()
+                self._prune(now)
+        self.reload()
+
+    # Accessors
+    def signing_key(self) -> SigningKey:
+        self._maybe_reload()
+        if self._signing_key is None:
+            self.maintain()
+        if self._signing_key is None:
+            raise RuntimeError(f"No JWT signing key available in {self.keys_dir}")
+        return self._signing_key
+
+    def verification_key(self, kid: str):
+        self._maybe_reload()
+        key = self._verification_keys.get(kid)
+        if key is None and kid not in self._keys and time.monotonic() - self._last_forced_reload > 1.0:
+            # Unknown kid: another worker may just have rotated. Re-read at most
+            # once a second so garbage kids can't force a reload per request.
+            self._last_forced_reload = time.monotonic()
+            self.reload()
+            key = self._verification_keys.get(kid)
+        return key
+
+    def jwks(self) -> bytes:
+        self._maybe_reload()
+        return self._jwks
+
+
+keyring = KeyRing(
+    keys_dir=JWT_KEYS_DIR,
+    algorithm=JWT_ALGORITHM,
+    rotation=timedelta(days=JWT_KEY_ROTATION_DAYS),
+    prepublish=timedelta(hours=JWT_KEY_PREPUBLISH_HOURS),
+    token_lifetime=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+)
+
+
+# Token helpers
+def encode_token(claims: dict) -> str:
+    started = time.perf_counter()
+    key = keyring.signing_key()
+    token = jwt.encode(claims, key.private_key, algorithm=key.algorithm, headers={"kid": key.kid})
+    metrics.JWT_SECONDS.observe(time.perf_counter() - started, "encode")
+    return token
+
+def decode_token(token: str) -> dict:
+    """Verify a token against the key named by its `kid` header. Raises JWTError."""
+    started = time.perf_counter()
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = keyring.verification_key(kid) if kid else None
+        if key is None:
+            raise JWTError("Unknown signing key")
+        return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+    finally:
+        metrics.JWT_SECONDS.observe(time.perf_counter() - started, "decode")
+
+
+# Background rotation, so key generation never happens on the request path
+async def rotation_loop():
+    while True:
+        await asyncio.sleep(JWT_KEYS_RELOAD_SECONDS)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, keyring.maintain)
+        except Exception as exc:
+            logger.error("JWT key maintenance failed: %s", exc)
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import os
+import random
+import smtplib
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+
+from database import AsyncSessionLocal, use_primary
+from models import EmailOutbox
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# SMTP settings
+# SMTP_SECURITY: "ssl" (implicit TLS, e.g. port 465), "starttls" (e.g. port 587)
+# or "none" (plain, e.g. a local aiosmtpd on port 8025). Login is skipped when
+# SMTP_USERNAME is empty. There are no default credentials or sender; set them
+# in the environment.
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "ssl").lower()
+SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+EMAIL_FROM = os.getenv("EMAIL_FROM", "")
+EMAIL_FROM_NAME = os.getenv("EMAIL_FROM_NAME", "AuthPro")
+
+# Outbox worker settings
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "10"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+# How long a claimed batch stays reserved for one worker before others may retry it
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+# Idle SMTP connections are closed after this long
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "60"))
+OUTBOX_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("OUTBOX_SHUTDOWN_TIMEOUT_SECONDS", "10"))
+
+
+def enqueue_email(db: AsyncSession, to_address: str, subject: str, text_body: str, html_body: str = None):
+    """
+    Queue an email in the caller's transaction. It is delivered once the caller
+    commits; call outbox_worker.notify() after the commit to send it right away.
+    """
+    message = EmailOutbox(
+        to_address=to_address,
+        subject=subject,
+        text_body=text_body,
+        html_body=html_body,
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(message)
+    return message
+
+
+def backoff_delay(attempts: int) -> float:
+    """Exponential backoff with jitter for the given number of failed attempts."""
+    delay = min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class SMTPConnection:
+    """
+    One authenticated SMTP session reused across messages and batches. Only
+    used from the worker's single sender thread.
+    """
+
+    def __init__(self):
+        self._server = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        if SMTP_SECURITY == "ssl":
+            server = smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS, context=ssl.create_default_context())
+        else:
+            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS)
+            if SMTP_SECURITY == "starttls":
+                server.starttls(context=ssl.create_default_context())
+        if SMTP_USERNAME:
+            server.login(SMTP_USERNAME, SMTP_PASSWORD)
+        logger.info("Opened SMTP connection to %s:%s", SMTP_SERVER, SMTP_PORT)
+        return server
+
+    def get(self):
+        now = time.monotonic()
+        if self._server is not None and now - self._last_used > SMTP_IDLE_SECONDS:
+            self.close()
+        if self._server is None:
+            self._server = self._connect()
+        self._last_used = now
+        return self._server
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+    def send(self, message: EmailMessage):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            try:
+                self.get().send_message(message)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError):
+                # The connection went stale; reconnect once and retry
+                self.close()
+                self.get().send_message(message)
+            outcome = "sent"
+        finally:
+            metrics.SMTP_SEND_SECONDS.observe(time.perf_counter() - started, outcome)
+
+
+def build_message(to_address: str, subject: str, text_body: str, html_body: str = None) -> EmailMessage:
+    message = EmailMessage()
+    message.set_content(text_body)
+    if html_body:
+        message.add_alternative(html_body, subtype="html")
+    message["Subject"] = subject
+    message["From"] = f"{EMAIL_FROM_NAME} <{EMAIL_FROM}>"
+    message["To"] = to_address
+    return message
+
+
+class OutboxWorker:
+    """
+    Drains email_outbox in batches. Each batch is claimed with a lease (so
+    several API workers can run this without sending twice), sent over the
+    shared SMTP connection on a dedicated thread, and the outcome recorded with
+    exponential backoff for failures.
+    """
+
+    def __init__(self):
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        # smtplib isn't thread-safe, so all SMTP I/O happens on one thread
+        self._sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp-sender")
+        self._connection = SMTPConnection()
+
+    def start(self):
+        if self._task is None:
+            if not EMAIL_FROM:
+                logger.warning("EMAIL_FROM is not set; outgoing email has no valid sender")
+            if not SMTP_USERNAME or not SMTP_PASSWORD:
+                logger.warning("SMTP_USERNAME/SMTP_PASSWORD are not set; connecting to %s without logging in", SMTP_SERVER)
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def notify(self):
+        """Wake the worker after committing new messages."""
+        self._wakeup.set()
+
+    async def stop(self, timeout: float = OUTBOX_SHUTDOWN_TIMEOUT_SECONDS):
+        """Stop polling, send whatever is already due, then close the connection."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Email outbox did not drain within %ss; remaining messages stay queued", timeout)
+            self._task.cancel()
+        self._task = None
+        await asyncio.get_running_loop().run_in_executor(self._sender, self._connection.close)
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.process_batch()
+            except Exception as exc:
+                logger.error("Email outbox batch failed: %s", exc)
+                processed = 0
+
+            if self._stopping:
+                # Drain: keep going while there is due mail, then exit
+                if processed == 0:
+                    return
+                continue
+            if processed >= OUTBOX_BATCH_SIZE:
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self):
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(EmailOutbox)
+                .where(
+                    EmailOutbox.status.in_(("pending", "sending")),
+                    EmailOutbox.next_attempt_at <= now,
+                )
+                .order_by(EmailOutbox.next_attempt_at)
+                .limit(OUTBOX_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+            messages = result.scalars().all()
+            for message in messages:
+                message.status = "sending"
+                message.next_attempt_at = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+            await db.commit()
+            return [
+                (message.id, message.to_address, message.subject, message.text_body, message.html_body)
+                for message in messages
+            ]
+
+    def _send_batch(self, batch):
+        """Runs on the sender thread. Returns {id: error or None}."""
+        outcomes = {}
+        for message_id, to_address, subject, text_body, html_body in batch:
+            try:
+                self._connection.send(build_message(to_address, subject, text_body, html_body))
+                outcomes[message_id] = None
+            except Exception as exc:
+                outcomes[message_id] = str(exc) or exc.__class__.__name__
+        return outcomes
+
+    async def process_batch(self):
+        """Claim, send and record one batch. Returns the number of messages handled."""
+        batch = await self._claim()
+        if not batch:
+            return 0
+
+        outcomes = await asyncio.get_running_loop().run_in_executor(self._sender, self._send_batch, batch)
+
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            # The rows were just claimed on the primary; a replica may not have them yet
+            use_primary(db)
+            result = await db.execute(select(EmailOutbox).where(EmailOutbox.id.in_(list(outcomes))))
+            for message in result.scalars():
+                error = outcomes[message.id]
+                message.attempts += 1
+                if error is None:
+                    message.status = "sent"
+                    message.sent_at = now
+                    message.last_error = None
+                elif message.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    message.status = "failed"
+                    message.last_error = error[:500]
+                    logger.error("Giving up on email %s to %s: %s", message.id, message.to_address, error)
+                else:
+                    message.status = "pending"
+                    message.next_attempt_at = now + timedelta(seconds=backoff_delay(message.attempts))
+                    message.last_error = error[:500]
+                    logger.warning("Email %s to %s failed (attempt %s): %s", message.id, message.to_address, message.attempts, error)
+            await db.commit()
+
+        sent = sum(1 for error in outcomes.values() if error is None)
+        logger.info("Email outbox batch: %s sent, %s failed", sent, len(outcomes) - sent)
+        return len(batch)
+
+
+outbox_worker = OutboxWorker()
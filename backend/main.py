@@ -1,15 +1,30 @@
 from fastapi import FastAPI, Depends, HTTPException, status, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.security import OAuth2PasswordBearer
+import asyncio
 import os
 from typing import List
 import logging
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
 from dotenv import load_dotenv
 
-from database import engine, Base, get_db
-from models import User, Role
+from database import engine, async_engine, writer_engine, replicas, Base, AsyncSessionLocal, PoolTimeout, pool_stats
+from models import User, Role, EmailOutbox
+import activity
+import hashing
+import jwt_keys
+import log_config
+import mailer
+import metrics
+import permissions
+import principal_cache
+import querystats
+import ratelimit
+import revocation
+import serialization
+from principal_cache import Principal
 
 # Load environment variables
 load_dotenv()
@@ -17,11 +32,9 @@ load_dotenv()
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+# Set up logging: records go through a queue and are written by a background
+# thread, so handlers never do I/O on the event loop
+log_config.setup_logging()
 logger = logging.getLogger(__name__)
 
 # Create FastAPI app
@@ -29,6 +42,8 @@ app = FastAPI(
     title="Auth Starter Kit API",
     description="A FastAPI backend with Google OAuth and token-based authentication",
     version="0.1.0",
+    # orjson-backed unless JSON_RESPONSE_CLASS=standard
+    default_response_class=serialization.ResponseClass,
 )
 
 # Session middleware - required for OAuth
@@ -50,25 +65,120 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
     allow_headers=["*"],
-    expose_headers=["Content-Type", "Authorization"],
+    expose_headers=["Content-Type", "Authorization", "X-DB-Query-Count", "X-DB-Query-Time-Ms"],
     max_age=600,  # Cache preflight requests for 10 minutes
 )
 
+# Per-request SQL query counts, timings and N+1 warnings
+querystats.install()
+app.add_middleware(querystats.QueryStatsMiddleware)
+
+# Request latency metrics; added last so it is outermost and times the whole stack
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Read replicas: probe them before serving, then keep checking; reads use the
+# primary until a replica passes (shut down in close_database)
+@app.on_event("startup")
+async def start_replica_checks():
+    await replicas.start()
+
+# The database is saturated: fail fast rather than queue more work behind it
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    logger.warning("%s %s: %s", request.method, request.url.path, exc)
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Database is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
 # Initialize default roles
 @app.on_event("startup")
 async def create_default_roles():
-    db = next(get_db())
     roles = ["user", "admin"]
     
-    for role_name in roles:
-        exists = db.query(Role).filter(Role.name == role_name).first()
-        if not exists:
-            role = Role(name=role_name, description=f"{role_name.capitalize()} role")
-            db.add(role)
-    
-    db.commit()
+    async with AsyncSessionLocal() as db:
+        for role_name in roles:
+            result = await db.execute(select(Role).where(Role.name == role_name))
+            if not result.scalars().first():
+                role = Role(name=role_name, description=f"{role_name.capitalize()} role")
+                db.add(role)
+        
+        await db.commit()
     logger.info("Default roles created")
 
+# Role permissions: seed and compile them once the roles exist, then reload
+# periodically so grants changed by another worker take effect
+@app.on_event("startup")
+async def start_permission_policy():
+    await permissions.policy.start()
+
+@app.on_event("shutdown")
+async def stop_permission_policy():
+    await permissions.policy.stop()
+
+# Clear out expired refresh token sessions
+@app.on_event("startup")
+async def purge_expired_sessions():
+    async with AsyncSessionLocal() as db:
+        purged = await auth.purge_expired_refresh_tokens(db)
+    logger.info("Purged %s expired refresh tokens", purged)
+
+# Password hashing pool lifecycle
+@app.on_event("startup")
+async def start_hashing_pool():
+    hashing.pool.start()
+
+@app.on_event("shutdown")
+async def stop_hashing_pool():
+    hashing.pool.shutdown()
+
+# JWT signing keys: make sure a key exists before serving, then keep the
+# rotation schedule in the background
+@app.on_event("startup")
+async def start_key_rotation():
+    await asyncio.get_running_loop().run_in_executor(None, jwt_keys.keyring.maintain)
+    app.state.key_rotation_task = asyncio.create_task(jwt_keys.rotation_loop())
+
+@app.on_event("shutdown")
+async def stop_key_rotation():
+    app.state.key_rotation_task.cancel()
+
+@app.on_event("startup")
+async def start_outbox_worker():
+    mailer.outbox_worker.start()
+
+@app.on_event("shutdown")
+async def stop_outbox_worker():
+    # Runs before the database is closed so queued emails can still be flushed
+    await mailer.outbox_worker.stop()
+
+# Access token denylist: load it before serving, then keep it in sync
+@app.on_event("startup")
+async def start_denylist():
+    await revocation.denylist.start()
+
+@app.on_event("shutdown")
+async def stop_denylist():
+    await revocation.denylist.stop()
+
+# Write-behind buffer for last_login
+@app.on_event("startup")
+async def start_activity_buffer():
+    activity.buffer.start()
+
+@app.on_event("shutdown")
+async def stop_activity_buffer():
+    # Runs before the database is closed so buffered writes are flushed
+    await activity.buffer.stop()
+
+@app.on_event("shutdown")
+async def close_database():
+    await replicas.stop()
+    if writer_engine is not None:
+        await writer_engine.dispose()
+    await async_engine.dispose()
+
 # Import routers - moved after app is created to avoid circular imports
 import auth
 import users
@@ -86,14 +196,122 @@ async def root():
         "redoc": "/redoc",
     }
 
-# Health check endpoint
+# Health check endpoint; open, for load balancer and container probes
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+# The /health/<name> endpoints below expose internals (pool state, SQL stats,
+# replica topology, role grants), so they are for admins only
+require_admin = auth.require_permissions("admin:access")
+
+# Password hashing pool stats (queue depth, rejections, wait times)
+@app.get("/health/hashing", dependencies=[Depends(require_admin)])
+async def hashing_health():
+    return hashing.pool.stats()
+
+# Logging queue stats (backlog, records dropped because the queue was full)
+@app.get("/health/logging", dependencies=[Depends(require_admin)])
+async def logging_health():
+    return log_config.stats()
+
+# Email outbox message counts by status (pending, sending, sent, failed)
+@app.get("/health/outbox", dependencies=[Depends(require_admin)])
+async def outbox_health():
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(EmailOutbox.status, func.count()).group_by(EmailOutbox.status))
+        return {"status": "ok", "outbox": dict(result.all())}
+
+# Principal cache stats (size, hit/miss counters)
+@app.get("/health/principal-cache", dependencies=[Depends(require_admin)])
+async def principal_cache_health():
+    return principal_cache.cache.stats()
+
+# Rate limiter stats (tracked keys, allowed/rejected requests)
+@app.get("/health/rate-limit", dependencies=[Depends(require_admin)])
+async def rate_limit_health():
+    return ratelimit.limiter.stats()
+
+# Write-behind buffer stats (pending last_login updates, batches flushed)
+@app.get("/health/activity", dependencies=[Depends(require_admin)])
+async def activity_health():
+    return activity.buffer.stats()
+
+# Compiled permission bits and each role's grants
+@app.get("/health/permissions", dependencies=[Depends(require_admin)])
+async def permissions_health():
+    return permissions.policy.stats()
+
+# Connection pools: checked out, overflow, waiters and checkout timeouts per
+# engine (including the SQLite writer under the production profile)
+@app.get("/health/db", dependencies=[Depends(require_admin)])
+async def db_health():
+    return pool_stats()
+
+# Read replica health and how many sessions each side served
+@app.get("/health/replicas", dependencies=[Depends(require_admin)])
+async def replicas_health():
+    return replicas.stats()
+
+# Token denylist stats (Bloom filter size, hits confirmed as revoked)
+@app.get("/health/revocation", dependencies=[Depends(require_admin)])
+async def revocation_health():
+    return revocation.denylist.stats()
+
+# SQL queries per route (requests, average/max queries, N+1 warnings)
+@app.get("/health/queries", dependencies=[Depends(require_admin)])
+async def queries_health():
+    return querystats.route_stats.snapshot()
+
+# Prometheus metrics. Scrape-time gauges/counters read the stats the modules
+# above already keep, so they cost nothing on the request path.
+metrics.counter_callback("principal_cache_hits", "Principal cache hits", lambda: principal_cache.cache.hits)
+metrics.counter_callback("principal_cache_misses", "Principal cache misses", lambda: principal_cache.cache.misses)
+metrics.gauge_callback("principal_cache_hit_ratio", "Principal cache hit ratio since start", lambda: principal_cache.cache.stats()["hit_ratio"])
+metrics.gauge_callback("principal_cache_size", "Principals cached", lambda: principal_cache.cache.stats()["size"])
+metrics.gauge_callback("password_hash_in_flight", "Password jobs running or queued", lambda: hashing.pool.stats()["in_flight"])
+metrics.counter_callback("password_hash_rejected", "Password jobs rejected because the pool was full", lambda: hashing.pool.stats()["rejected"])
+metrics.counter_callback("rate_limit_allowed", "Requests allowed by the rate limiter", lambda: ratelimit.limiter.allowed)
+metrics.counter_callback("rate_limit_rejected", "Requests rejected by the rate limiter", lambda: ratelimit.limiter.rejected)
+metrics.gauge_callback("activity_pending", "last_login updates waiting to be flushed", lambda: activity.buffer.stats()["pending"])
+metrics.gauge_callback(
+    "db_pool_checked_out", "Connections checked out of each pool",
+    lambda: {(label,): stats["checked_out"] for label, stats in pool_stats().items() if "checked_out" in stats}, ("engine",),
+)
+metrics.gauge_callback(
+    "db_pool_overflow", "Connections open beyond pool_size",
+    lambda: {(label,): stats["overflow"] for label, stats in pool_stats().items() if "overflow" in stats}, ("engine",),
+)
+metrics.gauge_callback(
+    "db_pool_waiting", "Requests waiting for a connection",
+    lambda: {(label,): stats["waiting"] for label, stats in pool_stats().items() if "waiting" in stats}, ("engine",),
+)
+metrics.counter_callback(
+    "db_pool_timeouts", "Checkouts that gave up after DB_POOL_TIMEOUT",
+    lambda: {(label,): stats["timeouts"] for label, stats in pool_stats().items() if "timeouts" in stats}, ("engine",),
+)
+metrics.counter_callback("log_records_dropped", "Log records dropped because the queue was full", lambda: log_config.stats()["dropped"])
+
+@app.on_event("startup")
+async def check_metrics_access():
+    if metrics.METRICS_ENABLED and not metrics.METRICS_TOKEN:
+        logger.warning("/metrics is enabled without METRICS_TOKEN; anyone who can reach the API can scrape it")
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not metrics.scrape_authorized(request.headers.get("authorization")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 # Protected example endpoint
 @app.get("/protected", response_model=dict)
-async def protected_route(request: Request, current_user: User = Depends(auth.get_current_user)):
+async def protected_route(request: Request, current_user: Principal = Depends(auth.get_current_principal)):
     return {
         "message": "This is a protected route",
         "user_id": current_user.id,
@@ -102,16 +320,7 @@ async def protected_route(request: Request, current_user: User = Depends(auth.ge
 
 # Admin-only example endpoint
 @app.get("/admin", response_model=dict)
-async def admin_route(request: Request, current_user: User = Depends(auth.get_current_user)):
-    # Check if user has admin role
-    is_admin = any(role.name == "admin" for role in current_user.roles)
-    
-    if not is_admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions. Admin role required."
-        )
-    
+async def admin_route(request: Request, current_user: Principal = Depends(auth.require_permissions("admin:access"))):
     return {
         "message": "This is an admin-only route",
         "user_id": current_user.id,
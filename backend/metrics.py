@@ -0,0 +1,279 @@
+import hmac
+import os
+import time
+from bisect import bisect_left
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Metrics settings
+# METRICS_ENABLED: serve /metrics and record request latencies (off by default;
+#   the metrics describe the service's internals)
+# METRICS_TOKEN: when set, scrapes must send "Authorization: Bearer <token>";
+#   without it /metrics is open, so only enable it on a private network
+# METRICS_MAX_SERIES: label combinations kept per metric; anything beyond that
+#   is folded into a single "other" series so cardinality stays bounded
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", "1000"))
+METRICS_PREFIX = "authpro_"
+
+# Starlette appends "; charset=utf-8"
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Bucket sets (seconds)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0)
+JWT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+POOL_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+SMTP_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = METRICS_PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._other = ("other",) * len(self.labelnames)
+
+    def _key(self, labels):
+        # Past the cap, unseen label sets share one overflow series
+        if labels in self._series or len(self._series) < METRICS_MAX_SERIES:
+            return labels
+        return self._other
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1.0):
+        key = self._key(labels)
+        self._series[key] = self._series.get(key, 0.0) + amount
+
+    def render(self):
+        lines = self.header()
+        for labels, value in list(self._series.items()):
+            lines.append(f"{self.name}_total{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram(Metric):
+    """
+    Fixed-bucket histogram. observe() is a bisect plus two list updates and
+    takes no lock: it is meant to be called from the event loop. Observations
+    made from worker threads go through the GIL and can in rare races lose an
+    increment, which is acceptable for latency metrics.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            # Per-bucket counts (the last slot is +Inf), then [sum, count]
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0, 0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        totals = series[1]
+        totals[0] += value
+        totals[1] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = self.header()
+        for labels, (counts, (total, count)) in list(self._series.items()):
+            cumulative = 0
+            bounds = [repr(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class CallbackMetric(Metric):
+    """
+    A gauge or counter read at scrape time from `callback`, which returns a
+    number, or {label values tuple: number} when the metric has labels. Used
+    for state other modules already track (cache hits, queue depths).
+    """
+
+    def __init__(self, name: str, documentation: str, callback, kind: str = "gauge", labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self):
+        lines = self.header()
+        value = self.callback()
+        suffix = "_total" if self.kind == "counter" else ""
+        samples = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, sample in samples:
+            if sample is not None:
+                lines.append(f"{self.name}{suffix}{_labels(self.labelnames, labels)} {float(sample)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def gauge_callback(name, documentation, callback, labelnames=()):
+    return registry.register(CallbackMetric(name, documentation, callback, "gauge", labelnames))
+
+
+def counter_callback(name, documentation, callback, labelnames=()):
+    return registry.register(CallbackMetric(name, documentation, callback, "counter", labelnames))
+
+
+def scrape_authorized(authorization) -> bool:
+    """Whether a scrape's Authorization header carries METRICS_TOKEN (always true when unset)."""
+    if not METRICS_TOKEN:
+        return True
+    scheme, _, token = (authorization or "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), METRICS_TOKEN.encode())
+
+
+# Hot-path metrics, recorded by the modules doing the work
+REQUEST_LATENCY = histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template and status",
+    ("method", "route", "status"), REQUEST_BUCKETS,
+)
+DB_QUERIES = histogram(
+    "db_queries_per_request", "SQL statements executed per request",
+    ("route",), COUNT_BUCKETS,
+)
+PASSWORD_HASH_SECONDS = histogram(
+    "password_hash_seconds", "Time spent hashing/verifying passwords in the pool workers",
+    ("operation",), HASH_BUCKETS,
+)
+PASSWORD_HASH_WAIT_SECONDS = histogram(
+    "password_hash_queue_wait_seconds", "Time password jobs waited for a pool worker",
+    ("operation",), POOL_BUCKETS,
+)
+JWT_SECONDS = histogram(
+    "jwt_seconds", "Time to sign or verify an access token",
+    ("operation",), JWT_BUCKETS,
+)
+DB_POOL_CHECKOUT_SECONDS = histogram(
+    "db_pool_checkout_seconds", "Time waiting to check a connection out of the pool",
+    ("engine",), POOL_BUCKETS,
+)
+SMTP_SEND_SECONDS = histogram(
+    "smtp_send_seconds", "Time to hand one message to the SMTP server",
+    ("outcome",), SMTP_BUCKETS,
+)
+
+
+# Endpoint function -> path template, filled on first use
+_route_paths = {}
+
+
+def route_path(scope) -> str:
+    """
+    Path template of the matched route (e.g. "/users/{user_id}"), so ids never
+    become label values. Only valid once routing has run.
+    """
+    endpoint = scope.get("endpoint")
+    path = _route_paths.get(endpoint)
+    if path is None:
+        path = "unmatched"
+        if endpoint is not None and "app" in scope:
+            for route in scope["app"].router.routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = _route_paths[endpoint] = route.path
+                    break
+    return path
+
+
+class MetricsMiddleware:
+    """Records latency per route template and status code."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started, scope["method"], route_path(scope), status_code,
+            )
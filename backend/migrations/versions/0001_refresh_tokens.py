@@ -0,0 +1,92 @@
+"""Move refresh tokens from users into a hashed, indexed refresh_tokens table
+
+Revision ID: 0001_refresh_tokens
+Revises:
+Create Date: 2026-10-17 00:40:00
+
+"""
+from datetime import datetime
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_refresh_tokens'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # The app creates missing tables on startup, so the table may already exist
+    if not inspector.has_table("refresh_tokens"):
+        op.create_table(
+            "refresh_tokens",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.String(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("token_hash", sa.String(length=64), nullable=False),
+            sa.Column("user_agent", sa.String(length=255), nullable=True),
+            sa.Column("ip_address", sa.String(length=45), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("last_used_at", sa.DateTime(), nullable=True),
+            sa.Column("expires_at", sa.DateTime(), nullable=False),
+            sa.UniqueConstraint("token_hash"),
+        )
+        op.create_index("ix_refresh_tokens_user_id", "refresh_tokens", ["user_id"])
+        op.create_index("ix_refresh_tokens_expires_at", "refresh_tokens", ["expires_at"])
+
+    user_columns = {column["name"] for column in inspector.get_columns("users")}
+    if "refresh_token" not in user_columns:
+        return
+
+    # Copy the still-valid tokens over, hashed like the app stores them
+    users = sa.table(
+        "users",
+        sa.column("id", sa.String),
+        sa.column("refresh_token", sa.String),
+        sa.column("refresh_token_expires_at", sa.DateTime),
+    )
+    refresh_tokens = sa.table(
+        "refresh_tokens",
+        sa.column("user_id", sa.String),
+        sa.column("token_hash", sa.String),
+        sa.column("expires_at", sa.DateTime),
+    )
+    rows = bind.execute(
+        sa.select(users.c.id, users.c.refresh_token, users.c.refresh_token_expires_at).where(
+            users.c.refresh_token.isnot(None),
+            users.c.refresh_token_expires_at > datetime.utcnow(),
+        )
+    ).all()
+    if rows:
+        op.bulk_insert(
+            refresh_tokens,
+            [
+                {
+                    "user_id": user_id,
+                    "token_hash": hashlib.sha256(token.encode()).hexdigest(),
+                    "expires_at": expires_at,
+                }
+                for user_id, token, expires_at in rows
+            ],
+        )
+
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("refresh_token")
+        batch_op.drop_column("refresh_token_expires_at")
+
+
+def downgrade() -> None:
+    # Hashed tokens can't be copied back, so sessions are dropped on downgrade
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.add_column(sa.Column("refresh_token", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("refresh_token_expires_at", sa.DateTime(), nullable=True))
+
+    op.drop_index("ix_refresh_tokens_expires_at", table_name="refresh_tokens")
+    op.drop_index("ix_refresh_tokens_user_id", table_name="refresh_tokens")
+    op.drop_table("refresh_tokens")
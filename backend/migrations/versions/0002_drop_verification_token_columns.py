@@ -0,0 +1,36 @@
+"""Drop the stored email verification token columns
+
+Verification tokens are now signed and self-contained, so nothing reads
+these columns any more. Tokens issued before this migration stop working;
+users can request a new one with /users/resend-verification.
+
+Revision ID: 0002_drop_verification_tokens
+Revises: 0001_refresh_tokens
+Create Date: 2026-10-17 00:50:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_drop_verification_tokens'
+down_revision = '0001_refresh_tokens'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    user_columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")}
+    if "verification_token" not in user_columns:
+        return
+
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("verification_token")
+        batch_op.drop_column("verification_token_expires_at")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.add_column(sa.Column("verification_token", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("verification_token_expires_at", sa.DateTime(), nullable=True))
@@ -0,0 +1,27 @@
+"""Index users by (created_at, id) for keyset pagination
+
+Revision ID: 0004_users_created_at_index
+Revises: 0003_email_outbox
+Create Date: 2026-10-17 02:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_users_created_at_index'
+down_revision = '0003_email_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The app creates the index with the table on fresh databases
+    indexes = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes("users")}
+    if "ix_users_created_at_id" not in indexes:
+        op.create_index("ix_users_created_at_id", "users", ["created_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_created_at_id", table_name="users")
@@ -0,0 +1,38 @@
+"""Add the access token denylist
+
+Revision ID: 0005_revoked_tokens
+Revises: 0004_users_created_at_index
+Create Date: 2026-10-17 03:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_revoked_tokens'
+down_revision = '0004_users_created_at_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The app creates missing tables on startup, so the table may already exist
+    if sa.inspect(op.get_bind()).has_table("revoked_tokens"):
+        return
+
+    op.create_table(
+        "revoked_tokens",
+        sa.Column("key", sa.String(length=100), primary_key=True),
+        sa.Column("not_before", sa.DateTime(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("revoked_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_revoked_tokens_expires_at", "revoked_tokens", ["expires_at"])
+    op.create_index("ix_revoked_tokens_revoked_at", "revoked_tokens", ["revoked_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_revoked_tokens_revoked_at", table_name="revoked_tokens")
+    op.drop_index("ix_revoked_tokens_expires_at", table_name="revoked_tokens")
+    op.drop_table("revoked_tokens")
@@ -0,0 +1,44 @@
+"""Add permissions and role_permissions for compiled RBAC
+
+Revision ID: 0006_permissions
+Revises: 0005_revoked_tokens
+Create Date: 2026-10-17 04:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_permissions'
+down_revision = '0005_revoked_tokens'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    # The app creates missing tables on startup, so the tables may already
+    # exist; it also seeds the permissions and their default grants
+    if not inspector.has_table("permissions"):
+        op.create_table(
+            "permissions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(length=100), nullable=False),
+            sa.Column("description", sa.String(), nullable=True),
+            sa.Column("bit", sa.Integer(), nullable=False),
+            sa.UniqueConstraint("name"),
+            sa.UniqueConstraint("bit"),
+        )
+    if not inspector.has_table("role_permissions"):
+        op.create_table(
+            "role_permissions",
+            sa.Column("role_id", sa.Integer(), sa.ForeignKey("roles.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("permission_id", sa.Integer(), sa.ForeignKey("permissions.id", ondelete="CASCADE"), primary_key=True),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("role_permissions")
+    op.drop_table("permissions")
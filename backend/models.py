@@ -1,4 +1,5 @@
-from sqlalchemy import Boolean, Column, String, Integer, DateTime, ForeignKey, Table, text
+from sqlalchemy import Boolean, Column, String, Integer, DateTime, ForeignKey, Index, Table, Text, text
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
@@ -16,6 +17,29 @@ class Role(Base):
     
     # Relationship to users through user_roles table
     users = relationship("User", secondary="user_roles", back_populates="roles")
+    
+    # Named permissions granted to the role, compiled into bitsets by permissions.py
+    permissions = relationship("Permission", secondary="role_permissions", back_populates="roles")
+
+# A named permission. Each one owns a fixed bit in the compiled permission
+# masks, so bits are never reused or renumbered.
+class Permission(Base):
+    __tablename__ = "permissions"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+    description = Column(String, nullable=True)
+    bit = Column(Integer, unique=True, nullable=False)
+    
+    roles = relationship("Role", secondary="role_permissions", back_populates="permissions")
+
+# Association table for many-to-many relationship between Role and Permission
+role_permissions = Table(
+    "role_permissions",
+    Base.metadata,
+    Column("role_id", Integer, ForeignKey("roles.id", ondelete="CASCADE"), primary_key=True),
+    Column("permission_id", Integer, ForeignKey("permissions.id", ondelete="CASCADE"), primary_key=True),
+)
 
 # Association table for many-to-many relationship between User and Role
 user_roles = Table(
@@ -27,6 +51,11 @@ user_roles = Table(
 
 class User(Base):
     __tablename__ = "users"
+    # Fetch server-generated columns (created_at) on INSERT, since they
+    # can't be lazy-loaded later on an async session
+    __mapper_args__ = {"eager_defaults": True}
+    # Keyset pagination for the admin listing walks (created_at, id)
+    __table_args__ = (Index("ix_users_created_at_id", "created_at", "id"),)
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     email = Column(String, unique=True, index=True)
@@ -40,18 +69,73 @@ class User(Base):
     oauth_provider = Column(String, nullable=True)
     oauth_id = Column(String, nullable=True)
     
-    # Email verification fields
-    verification_token = Column(String, nullable=True)
-    verification_token_expires_at = Column(DateTime, nullable=True)
-    
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=text('NOW()'))
-    updated_at = Column(DateTime(timezone=True), server_default=text('NOW()'), onupdate=datetime.utcnow)
+    # SQLite's CURRENT_TIMESTAMP has no microseconds; bind values the same way
+    # so comparisons against created_at (pagination cursors) line up
+    created_at = Column(
+        DateTime(timezone=True).with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite"),
+        server_default=func.now(),
+    )
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=datetime.utcnow)
     last_login = Column(DateTime(timezone=True), nullable=True)
     
     # Relationship with roles
     roles = relationship("Role", secondary=user_roles, back_populates="users")
     
-    # Token related fields (for refresh tokens)
-    refresh_token = Column(String, nullable=True)
-    refresh_token_expires_at = Column(DateTime, nullable=True)
+    # Active refresh tokens, one per signed-in device
+    refresh_tokens = relationship("RefreshToken", back_populates="user", cascade="all, delete-orphan")
+
+# Refresh tokens are stored hashed, one row per session, so a user can be
+# signed in on several devices and each one can be logged out on its own
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    # SHA-256 of the token; the unique index makes lookups O(log n)
+    token_hash = Column(String(64), nullable=False, unique=True)
+    
+    # Device metadata
+    user_agent = Column(String(255), nullable=True)
+    ip_address = Column(String(45), nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    user = relationship("User", back_populates="refresh_tokens")
+
+# Outgoing email, written in the same transaction as the change that triggers
+# it and delivered by the background worker in mailer.py
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    # The worker claims due messages by (status, next_attempt_at)
+    __table_args__ = (Index("ix_email_outbox_due", "status", "next_attempt_at"),)
+    
+    id = Column(Integer, primary_key=True)
+    to_address = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    text_body = Column(Text, nullable=False)
+    html_body = Column(Text, nullable=True)
+    
+    # pending -> sending -> sent, or failed once attempts run out. While a
+    # message is "sending", next_attempt_at is the end of the worker's lease.
+    status = Column(String(16), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(String, nullable=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+
+# Revoked access tokens: "jti:<jti>" revokes one token, "user:<id>" every token
+# issued to the user before not_before. Rows are only needed until the tokens
+# they cover would have expired anyway.
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    key = Column(String(100), primary_key=True)
+    not_before = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    # Workers pick up each other's revocations by polling on this
+    revoked_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from dotenv import load_dotenv
+
+from database import AsyncSessionLocal
+from models import Permission, Role
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Policy settings
+# POLICY_RELOAD_SECONDS: how often each worker recompiles role permissions
+#   from the database, so grants changed elsewhere take effect; 0 disables it
+POLICY_RELOAD_SECONDS = float(os.getenv("POLICY_RELOAD_SECONDS", "60"))
+
+# Permissions the application checks, with the roles that get them when the
+# permission is first created. Grants can be changed in role_permissions
+# afterwards; they are never re-added.
+PERMISSIONS = {
+    "users:list": ("List and export users", ["admin"]),
+    "users:import": ("Bulk-import users", ["admin"]),
+    "users:read": ("Read any user's profile", ["admin"]),
+    "users:delete": ("Delete any user", ["admin"]),
+    "admin:access": ("Use the admin endpoints", ["admin"]),
+}
+
+
+class Policy:
+    """
+    Role permissions compiled into integer bitsets. Each permission owns a
+    stable bit (permissions.bit), a role's mask is the OR of its permissions'
+    bits, and a principal's mask is the OR of its roles' masks, so a check is
+    a single AND. `version` changes whenever a reload changes any mask.
+    """
+
+    def __init__(self):
+        self.bits = {}
+        self.role_masks = {}
+        self.version = 0
+        self._task = None
+
+    def mask_of(self, names):
+        """Mask for a set of permission names, or None if any isn't compiled (so nobody has it)."""
+        mask = 0
+        for name in names:
+            bit = self.bits.get(name)
+            if bit is None:
+                return None
+            mask |= bit
+        return mask
+
+    def mask_for_roles(self, role_names) -> int:
+        mask = 0
+        for name in role_names:
+            mask |= self.role_masks.get(name, 0)
+        return mask
+
+    # Loading
+    async def seed(self):
+        """Create missing permissions in PERMISSIONS, granting them to their default roles."""
+        async with AsyncSessionLocal() as db:
+            existing = set((await db.execute(select(Permission.name))).scalars())
+            missing = [name for name in PERMISSIONS if name not in existing]
+            if not missing:
+                return
+            highest = (await db.execute(select(func.max(Permission.bit)))).scalar()
+            next_bit = 0 if highest is None else highest + 1
+            roles = {role.name: role for role in (await db.execute(select(Role).options(selectinload(Role.permissions)))).scalars()}
+            for offset, name in enumerate(missing):
+                description, default_roles = PERMISSIONS[name]
+                permission = Permission(name=name, description=description, bit=next_bit + offset)
+                db.add(permission)
+                for role_name in default_roles:
+                    if role_name in roles:
+                        roles[role_name].permissions.append(permission)
+            try:
+                await db.commit()
+            except IntegrityError:
+                # Another worker seeded the same permissions first
+                await db.rollback()
+                return
+        logger.info("Created permissions: %s", ", ".join(missing))
+
+    async def reload(self):
+        """Recompile every role's mask from the database."""
+        async with AsyncSessionLocal() as db:
+            permissions = (await db.execute(select(Permission))).scalars().all()
+            roles = (await db.execute(select(Role).options(selectinload(Role.permissions)))).scalars().all()
+        bits = {permission.name: 1 << permission.bit for permission in permissions}
+        role_masks = {role.name: self._compile_role(role) for role in roles}
+        if bits != self.bits or role_masks != self.role_masks:
+            self.bits, self.role_masks = bits, role_masks
+            self.version += 1
+
+    @staticmethod
+    def _compile_role(role) -> int:
+        mask = 0
+        for permission in role.permissions:
+            mask |= 1 << permission.bit
+        return mask
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(POLICY_RELOAD_SECONDS)
+            try:
+                await self.reload()
+            except Exception as exc:
+                logger.error("Permission policy reload failed: %s", exc)
+
+    async def start(self):
+        """Seed and compile the policy, then keep it fresh in the background."""
+        await self.seed()
+        await self.reload()
+        if self._task is None and POLICY_RELOAD_SECONDS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        names = sorted(self.bits, key=self.bits.get)
+        return {
+            "version": self.version,
+            "permissions": {name: self.bits[name].bit_length() - 1 for name in names},
+            "roles": {
+                role: [name for name in names if mask & self.bits[name]]
+                for role, mask in sorted(self.role_masks.items())
+            },
+        }
+
+
+policy = Policy()
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from permissions import policy
+
+# Load environment variables
+load_dotenv()
+
+# Cache settings
+# Entries are only invalidated explicitly in the process that made the change,
+# so with several workers the TTL bounds how long another worker may serve a
+# stale principal.
+PRINCIPAL_CACHE_ENABLED = os.getenv("PRINCIPAL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE", "10000"))
+
+
+class Principal:
+    """The parts of a user needed to authorize a request, detached from any session."""
+
+    __slots__ = ("id", "email", "is_active", "is_verified", "role_names", "updated_at", "_permissions", "_policy_version", "_etag")
+
+    def __init__(self, id: str, email: str, is_active: bool, is_verified: bool, role_names, updated_at=None):
+        self.id = id
+        self.email = email
+        self.is_active = is_active
+        self.is_verified = is_verified
+        self.role_names = frozenset(role_names)
+        self.updated_at = updated_at
+        self._permissions = 0
+        self._policy_version = None
+        self._etag = None
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(
+            id=user.id,
+            email=user.email,
+            is_active=user.is_active,
+            is_verified=user.is_verified,
+            role_names=[role.name for role in user.roles or []],
+            updated_at=user.updated_at,
+        )
+
+    def has_role(self, name: str) -> bool:
+        return name in self.role_names
+
+    @property
+    def etag(self) -> str:
+        """
+        Weak ETag for the user's profile. updated_at moves on every ORM
+        update of the row; role changes don't touch it, so roles are hashed in.
+        """
+        if self._etag is None:
+            version = f"{self.id}|{self.updated_at.isoformat() if self.updated_at else ''}|{','.join(sorted(self.role_names))}"
+            self._etag = f'W/"{hashlib.blake2b(version.encode(), digest_size=12).hexdigest()}"'
+        return self._etag
+
+    @property
+    def permissions(self) -> int:
+        """Effective permission mask, recompiled only when the policy changes."""
+        if self._policy_version != policy.version:
+            self._permissions = policy.mask_for_roles(self.role_names)
+            self._policy_version = policy.version
+        return self._permissions
+
+    def has_permissions(self, mask) -> bool:
+        return mask is not None and self.permissions & mask == mask
+
+    def can(self, *names: str) -> bool:
+        return self.has_permissions(policy.mask_of(names))
+
+
+class PrincipalCache:
+    """Thread-safe TTL + LRU cache of principals keyed by user id (the token `sub`)."""
+
+    def __init__(self, max_size: int, ttl_seconds: float, enabled: bool = True):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled and max_size > 0 and ttl_seconds > 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str):
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            principal, expires_at = entry
+            if expires_at <= now:
+                del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return principal
+
+    def set(self, principal: Principal):
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[principal.id] = (principal, expires_at)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+cache = PrincipalCache(
+    max_size=PRINCIPAL_CACHE_MAX_SIZE,
+    ttl_seconds=PRINCIPAL_CACHE_TTL_SECONDS,
+    enabled=PRINCIPAL_CACHE_ENABLED,
+)
@@ -0,0 +1,173 @@
+import logging
+import os
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from dotenv import load_dotenv
+
+from database import engine, request_engines
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Query stats settings
+# QUERY_STATS_ENABLED: count queries per request
+# QUERY_STATS_HEADERS: add X-DB-Query-Count / X-DB-Query-Time-Ms to responses
+#   (on by default in development only)
+# QUERY_STATS_N_PLUS_ONE_THRESHOLD: warn when one statement runs this many
+#   times in a single request
+# QUERY_STATS_WARN_QUERIES: warn when a request runs more queries than this
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() in ("1", "true", "yes")
+QUERY_STATS_HEADERS = os.getenv(
+    "QUERY_STATS_HEADERS",
+    "true" if os.getenv("ENVIRONMENT", "development") == "development" else "false",
+).lower() in ("1", "true", "yes")
+QUERY_STATS_N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_STATS_N_PLUS_ONE_THRESHOLD", "5"))
+QUERY_STATS_WARN_QUERIES = int(os.getenv("QUERY_STATS_WARN_QUERIES", "20"))
+
+# Stats for the request being handled; None outside requests (background
+# workers), in which case the engine hooks do nothing
+_current = ContextVar("query_stats", default=None)
+
+
+class RequestQueries:
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        # Statement text -> executions; bind values aren't part of the text,
+        # so repeats of one shape land on the same key
+        self.statements = {}
+
+    def repeated(self, threshold: int):
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+
+# The start time lives on the statement's execution context, so a statement
+# that raises can't leave a stale entry behind on the pooled connection
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None and context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _record(stats: RequestQueries, context, statement: str):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    context._query_started = None
+    stats.seconds += time.perf_counter() - started
+    stats.count += 1
+    stats.statements[statement] = stats.statements.get(statement, 0) + 1
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        _record(stats, context, statement)
+
+
+def _handle_error(exception_context):
+    # Failed statements count too; their time was spent all the same
+    stats = _current.get()
+    if stats is not None and exception_context.execution_context is not None:
+        _record(stats, exception_context.execution_context, exception_context.statement)
+
+
+def install():
+    """Hook the query counters into every engine, replicas included. Safe to call more than once."""
+    for target in [engine] + [async_engine.sync_engine for _, async_engine in request_engines()]:
+        if not event.contains(target, "after_cursor_execute", _after_cursor_execute):
+            event.listen(target, "before_cursor_execute", _before_cursor_execute)
+            event.listen(target, "after_cursor_execute", _after_cursor_execute)
+            event.listen(target, "handle_error", _handle_error)
+
+
+class RouteStats:
+    """Per-route totals, so the query budget of each route can be watched in production."""
+
+    def __init__(self):
+        self.routes = {}
+
+    def record(self, route: str, stats: RequestQueries, n_plus_one: bool):
+        entry = self.routes.get(route)
+        if entry is None:
+            entry = self.routes[route] = {
+                "requests": 0, "queries": 0, "max_queries": 0, "db_seconds": 0.0, "n_plus_one": 0,
+            }
+        entry["requests"] += 1
+        entry["queries"] += stats.count
+        entry["db_seconds"] += stats.seconds
+        if stats.count > entry["max_queries"]:
+            entry["max_queries"] = stats.count
+        if n_plus_one:
+            entry["n_plus_one"] += 1
+
+    def snapshot(self):
+        return {
+            route: dict(
+                entry,
+                avg_queries=round(entry["queries"] / entry["requests"], 2),
+                db_seconds=round(entry["db_seconds"], 4),
+            )
+            for route, entry in sorted(self.routes.items())
+        }
+
+
+route_stats = RouteStats()
+
+
+def route_name(scope) -> str:
+    """Method plus path template (e.g. "GET /users/{user_id}"), so ids don't split the stats."""
+    return f"{scope['method']} {metrics.route_path(scope)}"
+
+
+class QueryStatsMiddleware:
+    """
+    Counts the SQL statements each request runs and the time spent in them.
+    Counts cover everything up to the response headers; work done while a
+    body streams or in dependency teardown isn't included in the headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_STATS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueries()
+        token = _current.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and QUERY_STATS_HEADERS:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-query-time-ms", f"{stats.seconds * 1000:.2f}".encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            self.finish(scope, stats)
+
+    def finish(self, scope, stats: RequestQueries):
+        route = route_name(scope)
+        repeated = stats.repeated(QUERY_STATS_N_PLUS_ONE_THRESHOLD)
+        for statement, count in repeated.items():
+            logger.warning(
+                "Possible N+1 in %s: statement ran %s times",
+                route, count,
+                extra={"event": "n_plus_one", "route": route, "statement": statement[:300]},
+            )
+        if stats.count > QUERY_STATS_WARN_QUERIES:
+            logger.warning("%s ran %s queries (budget %s)", route, stats.count, QUERY_STATS_WARN_QUERIES)
+        route_stats.record(route, stats, bool(repeated))
+        metrics.DB_QUERIES.observe(stats.count, route)
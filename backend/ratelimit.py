@@ -0,0 +1,243 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+from dotenv import load_dotenv
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # Only needed for RATE_LIMIT_BACKEND=redis
+    redis_asyncio = None
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Rate limit settings
+# RATE_LIMIT_BACKEND: "memory" (per process) or "redis" (shared by all workers,
+#   needs `pip install redis` and RATE_LIMIT_REDIS_URL)
+# RATE_LIMIT_MAX_KEYS: buckets kept in memory; the least recently used are
+#   dropped beyond this, which is the same as letting them refill
+# RATE_LIMIT_TRUST_FORWARDED: take the client IP from X-Forwarded-For; only
+#   enable behind a proxy that sets it
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "64"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "200000"))
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes")
+
+# Limits per route and key, as "<requests>/<seconds>": a bucket holds
+# <requests> tokens and refills completely over <seconds>
+RATE_LIMITS = {
+    "login": {
+        "ip": os.getenv("RATE_LIMIT_LOGIN_IP", "30/60"),
+        "email": os.getenv("RATE_LIMIT_LOGIN_EMAIL", "10/300"),
+    },
+    "refresh": {
+        "ip": os.getenv("RATE_LIMIT_REFRESH_IP", "60/60"),
+    },
+    "register": {
+        "ip": os.getenv("RATE_LIMIT_REGISTER_IP", "10/600"),
+        "email": os.getenv("RATE_LIMIT_REGISTER_EMAIL", "5/3600"),
+    },
+}
+
+
+class Rule:
+    """A token bucket shape: `capacity` requests, refilled at `rate` per second."""
+
+    __slots__ = ("capacity", "rate")
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / float(period)
+
+    @classmethod
+    def parse(cls, spec: str):
+        requests, _, seconds = spec.partition("/")
+        return cls(float(requests), float(seconds or 1))
+
+
+class MemoryBackend:
+    """
+    Token buckets in process memory, split across shards so each lock guards
+    only a slice of the keys. A bucket is two floats updated in O(1); each
+    shard is an LRU so the total number of keys stays bounded.
+    """
+
+    def __init__(self, shards: int, max_keys: int):
+        self.shards = [OrderedDict() for _ in range(max(1, shards))]
+        self.locks = [threading.Lock() for _ in self.shards]
+        self.max_keys_per_shard = max(1, max_keys // len(self.shards))
+        self.evictions = 0
+
+    def _take(self, key: str, rule: Rule, now: float) -> float:
+        index = hash(key) % len(self.shards)
+        buckets = self.shards[index]
+        with self.locks[index]:
+            state = buckets.get(key)
+            if state is None:
+                tokens = rule.capacity
+            else:
+                tokens = min(rule.capacity, state[0] + (now - state[1]) * rule.rate)
+                buckets.move_to_end(key)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / rule.rate
+            buckets[key] = (tokens, now)
+            if len(buckets) > self.max_keys_per_shard:
+                buckets.popitem(last=False)
+                self.evictions += 1
+            return retry_after
+
+    async def take(self, key: str, rule: Rule) -> float:
+        """Spend one token. Returns 0 if allowed, else seconds until a token is available."""
+        return self._take(key, rule, time.monotonic())
+
+    def size(self):
+        return sum(len(buckets) for buckets in self.shards)
+
+
+# Atomic token bucket in Redis, using the server clock so all workers agree
+REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+
+class RedisBackend:
+    """Token buckets shared through Redis, for multi-worker deployments."""
+
+    def __init__(self, url: str):
+        if redis_asyncio is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        self.client = redis_asyncio.from_url(url)
+        self.script = self.client.register_script(REDIS_TOKEN_BUCKET)
+
+    async def take(self, key: str, rule: Rule) -> float:
+        try:
+            result = await self.script(keys=[f"ratelimit:{key}"], args=[rule.capacity, rule.rate])
+            return float(result)
+        except Exception as exc:
+            # Fail open: an unavailable limiter shouldn't take logins down with it
+            logger.warning("Rate limit backend error, allowing request: %s", exc)
+            return 0.0
+
+    def size(self):
+        return None
+
+
+class RateLimiter:
+    def __init__(self, backend, limits: dict, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self.rules = {
+            route: {kind: Rule.parse(spec) for kind, spec in kinds.items() if spec}
+            for route, kinds in limits.items()
+        }
+        self.allowed = 0
+        self.rejected = 0
+
+    async def check(self, route: str, ip: str = None, email: str = None):
+        """Raises a 429 with Retry-After if any of the route's buckets is empty."""
+        if not self.enabled:
+            return
+        keys = {"ip": ip, "email": email.strip().lower() if email else None}
+        retry_after = 0.0
+        for kind, rule in self.rules.get(route, {}).items():
+            value = keys.get(kind)
+            if not value:
+                continue
+            # Hash emails so the key space (and Redis) never holds addresses
+            if kind == "email":
+                value = hashlib.sha256(value.encode()).hexdigest()[:32]
+            retry_after = max(retry_after, await self.backend.take(f"{route}:{kind}:{value}", rule))
+        if retry_after > 0:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+        self.allowed += 1
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "backend": RATE_LIMIT_BACKEND,
+            "keys": self.backend.size(),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evictions": getattr(self.backend, "evictions", None),
+        }
+
+
+def create_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisBackend(RATE_LIMIT_REDIS_URL)
+    return MemoryBackend(RATE_LIMIT_SHARDS, RATE_LIMIT_MAX_KEYS)
+
+
+limiter = RateLimiter(create_backend(), RATE_LIMITS, enabled=RATE_LIMIT_ENABLED)
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def limit(route: str, email_field: str = None):
+    """
+    Dependency enforcing the limits for `route`. Use it in the route's
+    `dependencies=[...]` so it runs before the DB session and password work.
+    `email_field` names the form or JSON field holding the submitted email.
+    """
+    async def dependency(request: Request):
+        email = None
+        if email_field and limiter.rules.get(route, {}).get("email"):
+            email = await submitted_field(request, email_field)
+        await limiter.check(route, ip=client_ip(request), email=email)
+    return dependency
+
+
+async def submitted_field(request: Request, name: str):
+    """Read a field from the form or JSON body; Starlette caches both for the endpoint."""
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("application/json"):
+            body = await request.json()
+            value = body.get(name) if isinstance(body, dict) else None
+        elif content_type.startswith(("application/x-www-form-urlencoded", "multipart/form-data")):
+            value = (await request.form()).get(name)
+        else:
+            return None
+    except ValueError:
+        return None
+    return value if isinstance(value, str) else None
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+
+from database import AsyncSessionLocal, use_primary
+from models import RevokedToken
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Denylist settings
+# REVOCATION_SYNC_SECONDS: how often each worker loads revocations made by
+#   other workers; this is how long a revoked token can still work elsewhere
+# REVOCATION_REBUILD_SECONDS: how often expired entries are purged and the
+#   Bloom filter rebuilt from the remaining ones
+# REVOCATION_BLOOM_CAPACITY / REVOCATION_BLOOM_ERROR_RATE: initial filter
+#   size; it is rebuilt larger if the denylist outgrows it
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+REVOCATION_REBUILD_SECONDS = float(os.getenv("REVOCATION_REBUILD_SECONDS", "300"))
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+
+# Same lifetime as auth.ACCESS_TOKEN_EXPIRE_MINUTES; a user-wide revocation
+# has to outlive every token issued before it
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+
+def jti_key(jti: str) -> str:
+    return f"jti:{jti}"
+
+
+def user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def issued_at_of(payload: dict) -> datetime:
+    """When a token was issued: iat_ms (milliseconds) where present, else iat."""
+    if payload.get("iat_ms") is not None:
+        return datetime.utcfromtimestamp(payload["iat_ms"] / 1000)
+    return datetime.utcfromtimestamp(payload.get("iat", 0))
+
+
+class BloomFilter:
+    """
+    Set membership with no false negatives and a tunable false-positive rate.
+    Bit positions come from two hashes combined (Kirsch-Mitzenmacher double
+    hashing). The built-in hash() is enough since each filter only lives in
+    the process that built it.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add(self, key: str):
+        h1, h2 = hash(key), hash((key, "bloom")) | 1
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % self.size
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        # Stops at the first unset bit, which for absent keys is usually the first
+        h1, h2 = hash(key), hash((key, "bloom")) | 1
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class Denylist:
+    """
+    Revoked access tokens, persisted in revoked_tokens and mirrored in a
+    per-worker Bloom filter. A token that isn't in the filter is definitely not
+    revoked, so the common case costs a couple of hash computations and no
+    storage access; only filter hits are confirmed against the database. Every
+    read goes to the primary: a lagging replica could confirm a fresh
+    revocation as absent, or let sync() skip it for good.
+    """
+
+    def __init__(self):
+        self.bloom = BloomFilter(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
+        self._synced_at = None
+        self._rebuilt_at = None
+        self._task = None
+
+        # Counters exposed through stats()
+        self.checks = 0
+        self.bloom_hits = 0
+        self.revoked_hits = 0
+
+    # Revoking. Rows are added to the caller's session and committed with the
+    # rest of its change; the local filter is updated right away.
+    async def revoke_token(self, db: AsyncSession, payload: dict):
+        """Revoke one access token (by its decoded claims) until it expires."""
+        jti = payload.get("jti")
+        if not jti:
+            return
+        expires_at = datetime.utcfromtimestamp(payload["exp"]) if payload.get("exp") else datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        await db.merge(RevokedToken(key=jti_key(jti), expires_at=expires_at, revoked_at=datetime.utcnow()))
+        self.bloom.add(jti_key(jti))
+
+    async def revoke_user(self, db: AsyncSession, user_id: str):
+        """Revoke every access token issued to the user up to now."""
+        now = datetime.utcnow()
+        await db.merge(RevokedToken(
+            key=user_key(user_id),
+            not_before=now,
+            expires_at=now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+            revoked_at=now,
+        ))
+        self.bloom.add(user_key(user_id))
+
+    # Checking
+    async def is_revoked(self, payload: dict) -> bool:
+        self.checks += 1
+        keys = []
+        jti = payload.get("jti")
+        if jti and jti_key(jti) in self.bloom:
+            keys.append(jti_key(jti))
+        sub = payload.get("sub")
+        if sub and user_key(sub) in self.bloom:
+            keys.append(user_key(sub))
+        if not keys:
+            return False
+
+        # Possible hit: confirm against storage (the filter may be wrong)
+        self.bloom_hits += 1
+        async with AsyncSessionLocal() as db:
+            use_primary(db)
+            result = await db.execute(
+                select(RevokedToken).where(RevokedToken.key.in_(keys), RevokedToken.expires_at > datetime.utcnow())
+            )
+            entries = result.scalars().all()
+        issued_at = issued_at_of(payload)
+        for entry in entries:
+            if entry.not_before is None or issued_at < entry.not_before:
+                self.revoked_hits += 1
+                return True
+        return False
+
+    # Keeping the filter in step with the table
+    async def rebuild(self):
+        """Purge expired entries and rebuild the filter from the rest."""
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            use_primary(db)
+            await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+            await db.commit()
+            result = await db.execute(select(RevokedToken.key))
+            keys = result.scalars().all()
+        bloom = BloomFilter(max(REVOCATION_BLOOM_CAPACITY, len(keys) * 2), REVOCATION_BLOOM_ERROR_RATE)
+        for key in keys:
+            bloom.add(key)
+        # Revocations made locally while loading are re-added by the next sync
+        self.bloom = bloom
+        self._synced_at = self._rebuilt_at = now
+
+    async def sync(self):
+        """Add entries revoked (by any worker) since the last sync."""
+        now = datetime.utcnow()
+        # Overlap a little so rows committed just after the last poll aren't missed
+        since = self._synced_at - timedelta(seconds=REVOCATION_SYNC_SECONDS)
+        async with AsyncSessionLocal() as db:
+            use_primary(db)
+            result = await db.execute(select(RevokedToken.key).where(RevokedToken.revoked_at >= since))
+            for key in result.scalars():
+                # Skips keys seen in an earlier (overlapping) poll so count stays accurate
+                if key not in self.bloom:
+                    self.bloom.add(key)
+        self._synced_at = now
+        if self.bloom.count > self.bloom.capacity:
+            await self.rebuild()
+
+    async def _run(self):
+        while True:
+            try:
+                if self._rebuilt_at is None or (datetime.utcnow() - self._rebuilt_at).total_seconds() >= REVOCATION_REBUILD_SECONDS:
+                    await self.rebuild()
+                else:
+                    await self.sync()
+            except Exception as exc:
+                logger.error("Token denylist sync failed: %s", exc)
+            await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+
+    async def start(self):
+        """Load the current denylist, then keep it in sync in the background."""
+        if self._task is None:
+            await self.rebuild()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        return {
+            "bloom_entries": self.bloom.count,
+            "bloom_capacity": self.bloom.capacity,
+            "bloom_bytes": len(self.bloom.bits),
+            "checks": self.checks,
+            "bloom_hits": self.bloom_hits,
+            "revoked_hits": self.revoked_hits,
+            "synced_at": self._synced_at.isoformat() if self._synced_at else None,
+        }
+
+
+denylist = Denylist()
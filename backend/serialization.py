@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+from datetime import date, datetime
+
+from fastapi.responses import JSONResponse, Response
+from dotenv import load_dotenv
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:  # Falls back to the standard library encoder
+    orjson = None
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Response settings
+# JSON_RESPONSE_CLASS: orjson (the default, when installed) or standard
+JSON_RESPONSE_CLASS = os.getenv("JSON_RESPONSE_CLASS", "orjson").lower()
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class StandardJSONResponse(JSONResponse):
+    """JSONResponse that also encodes the datetimes compiled serializers leave in place."""
+
+    def render(self, content) -> bytes:
+        return json.dumps(
+            content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default,
+        ).encode("utf-8")
+
+
+if JSON_RESPONSE_CLASS == "orjson" and orjson is not None:
+    ResponseClass = ORJSONResponse
+else:
+    if JSON_RESPONSE_CLASS == "orjson":
+        logger.warning("orjson is not installed; using the standard JSON encoder")
+    ResponseClass = StandardJSONResponse
+
+
+# Compiled serializers. FastAPI validates a returned ORM object against the
+# response model, then walks the result with jsonable_encoder; for fixed
+# models the same output is a dict literal built straight from attributes.
+def compile_serializer(model):
+    """
+    Build `serialize(obj) -> dict` for a response model, reading each field
+    from an ORM object (nested models and lists of them included). Values
+    are not validated, and datetimes are left for the response class to
+    encode.
+    """
+    if not hasattr(model, "__fields__") or hasattr(model, "model_fields"):
+        # Pydantic v2 already validates and dumps in compiled code
+        return lambda obj: model.model_validate(obj).model_dump(mode="json", by_alias=True)
+
+    from pydantic import BaseModel
+    from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON
+
+    namespace = {}
+    items = []
+    for name, field in model.__fields__.items():
+        value = f"obj.{name}"
+        nested = isinstance(field.type_, type) and issubclass(field.type_, BaseModel)
+        if nested:
+            namespace[f"_{name}"] = compile_serializer(field.type_)
+        if field.shape == SHAPE_LIST:
+            value = f"[_{name}(item) for item in {value} or ()]" if nested else f"list({value} or ())"
+        elif field.shape != SHAPE_SINGLETON:
+            raise TypeError(f"{model.__name__}.{name}: unsupported field shape")
+        elif nested:
+            value = f"(_{name}({value}) if {value} is not None else None)"
+        items.append(f"{field.alias!r}: {value}")
+
+    source = f"def serialize(obj):\n    return {{{', '.join(items)}}}\n"
+    exec(compile(source, f"<serializer {model.__name__}>", "exec"), namespace)
+    return namespace["serialize"]
+
+
+def respond(content, response: Response = None, status_code: int = 200, headers=None):
+    """
+    Render already JSON-shaped content straight into ResponseClass, skipping
+    FastAPI's response validation and jsonable_encoder. Cookies, headers and
+    a status code set on an injected `response` are carried over.
+    """
+    rendered = ResponseClass(content, status_code=status_code, headers=headers)
+    if response is not None:
+        rendered.headers.raw.extend(response.headers.raw)
+        if response.status_code:
+            rendered.status_code = response.status_code
+    return rendered
@@ -0,0 +1,133 @@
+"""
+Shared fixtures. Settings are read when modules are imported, so the test
+environment (a throwaway SQLite file, fast bcrypt, no rate limiting or
+replicas) is set up here before anything from the app is imported.
+
+Run from the backend directory:
+    python -m pytest -q
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime
+
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix="authpro-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}",
+    "ASYNC_DATABASE_URL": "",
+    "DATABASE_REPLICA_URLS": "",
+    "SQLITE_PROFILE": "development",
+    "JWT_KEYS_DIR": os.path.join(TEST_DIR, "jwt_keys"),
+    "PASSWORD_HASH_SCHEMES": "bcrypt",
+    "PASSWORD_BCRYPT_ROUNDS": "4",
+    "PASSWORD_HASH_WORKERS": "2",
+    "RATE_LIMIT_ENABLED": "false",
+    "QUERY_STATS_HEADERS": "false",
+    "POLICY_RELOAD_SECONDS": "0",
+    "INTROSPECTION_CLIENTS": "resource-server:test-secret",
+    # Tests flush the last_login buffer themselves
+    "ACTIVITY_FLUSH_MS": "600000",
+    # Tests run outbox batches themselves
+    "OUTBOX_POLL_SECONDS": "3600",
+    "SMTP_SERVER": "localhost",
+    "SMTP_SECURITY": "none",
+})
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine, insert, select  # noqa: E402
+
+import auth  # noqa: E402
+import database  # noqa: E402
+import main  # noqa: E402
+import principal_cache  # noqa: E402
+from database import ReplicaSet, engine  # noqa: E402
+from hashing import pwd_context  # noqa: E402
+from models import Base, Role, User, user_roles  # noqa: E402
+
+PASSWORD = "password123"
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(autouse=True)
+def clear_cookies(request):
+    """Logins set auth cookies on the shared client; don't let them leak into other tests."""
+    yield
+    if "client" in request.fixturenames:
+        request.getfixturevalue("client").cookies.clear()
+
+
+@pytest.fixture(scope="session")
+def password_hash():
+    return pwd_context.hash(PASSWORD)
+
+
+@pytest.fixture
+def create_user(client, password_hash):
+    """
+    Insert a user straight into the database and return its id. Accepts any
+    users column (created_at included) plus `roles`, a list of role names.
+    """
+    def create(roles=("user",), **fields):
+        user_id = fields.pop("id", None) or str(uuid.uuid4())
+        row = {
+            "id": user_id,
+            "email": f"{user_id}@example.com",
+            "hashed_password": password_hash,
+            "is_active": True,
+            "is_verified": True,
+            "updated_at": datetime.utcnow(),
+        }
+        row.update(fields)
+        with engine.begin() as conn:
+            conn.execute(insert(User.__table__), row)
+            role_ids = dict(conn.execute(select(Role.name, Role.id).where(Role.name.in_(roles))).all())
+            if role_ids:
+                conn.execute(insert(user_roles), [{"user_id": user_id, "role_id": role_id} for role_id in role_ids.values()])
+        principal_cache.cache.invalidate(user_id)
+        return user_id
+
+    return create
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """
+    A healthy read replica in place of the configured ones (none), returning
+    its sync engine: a second SQLite file with the schema but none of the
+    primary's rows, i.e. a replica that has fallen far behind.
+    """
+    url = f"sqlite:///{os.path.join(TEST_DIR, 'replica.db')}"
+    replica_engine = create_engine(url)
+    Base.metadata.create_all(bind=replica_engine)
+    replica_engine.dispose()
+    replica_set = ReplicaSet([url])
+
+    async def check():
+        await replica_set.check()
+        await replica_set.stop()
+
+    asyncio.run(check())
+    assert replica_set.replicas[0].healthy
+    monkeypatch.setattr(database, "replicas", replica_set)
+    return replica_set.replicas[0].engine.sync_engine
+
+
+def auth_headers(user_id: str) -> dict:
+    return {"Authorization": f"Bearer {auth.create_access_token({'sub': user_id})}"}
+
+
+def login(client, email: str, password: str = PASSWORD) -> str:
+    response = client.post("/token", data={"username": email, "password": password})
+    assert response.status_code == 200, response.text
+    return response.json()["access_token"]
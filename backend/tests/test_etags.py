@@ -0,0 +1,83 @@
+from sqlalchemy import insert, select
+
+import activity
+import principal_cache
+from conftest import auth_headers, login
+from database import engine
+from models import Role, user_roles
+
+
+def fetch(client, path, headers, etag=None):
+    if etag is not None:
+        headers = dict(headers, **{"If-None-Match": etag})
+    return client.get(path, headers=headers)
+
+
+def test_matching_etag_gets_304(client, create_user):
+    headers = auth_headers(create_user())
+    first = fetch(client, "/users/me", headers)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert etag.startswith('W/"')
+
+    response = fetch(client, "/users/me", headers, etag)
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_if_none_match_uses_weak_comparison(client, create_user):
+    headers = auth_headers(create_user())
+    etag = fetch(client, "/users/me", headers).headers["ETag"]
+
+    assert fetch(client, "/users/me", headers, f'"other", {etag[2:]}').status_code == 304
+    assert fetch(client, "/users/me", headers, "*").status_code == 304
+    assert fetch(client, "/users/me", headers, 'W/"other"').status_code == 200
+
+
+def test_profile_update_changes_etag(client, create_user):
+    headers = auth_headers(create_user())
+    etag = fetch(client, "/users/me", headers).headers["ETag"]
+
+    assert client.patch("/users/me", headers=headers, json={"first_name": "Renamed"}).status_code == 200
+    response = fetch(client, "/users/me", headers, etag)
+
+    assert response.status_code == 200
+    assert response.json()["first_name"] == "Renamed"
+    assert response.headers["ETag"] != etag
+    assert fetch(client, "/users/me", headers, response.headers["ETag"]).status_code == 304
+
+
+def test_role_change_changes_etag(client, create_user):
+    user_id = create_user(roles=["user"])
+    headers = auth_headers(user_id)
+    etag = fetch(client, "/users/me", headers).headers["ETag"]
+
+    with engine.begin() as conn:
+        admin_role = conn.execute(select(Role.id).where(Role.name == "admin")).scalar_one()
+        conn.execute(insert(user_roles), {"user_id": user_id, "role_id": admin_role})
+    principal_cache.cache.invalidate(user_id)
+
+    assert fetch(client, "/users/me", headers, etag).status_code == 200
+
+
+def test_admin_reads_of_other_users_are_conditional(client, create_user):
+    user_id = create_user()
+    admin = auth_headers(create_user(roles=["admin"]))
+    etag = fetch(client, f"/users/{user_id}", admin).headers["ETag"]
+
+    assert fetch(client, f"/users/{user_id}", admin, etag).status_code == 304
+    assert fetch(client, "/users/me", auth_headers(user_id)).headers["ETag"] == etag
+
+
+def test_login_does_not_change_etag(client, create_user):
+    user_id = create_user()
+    headers = auth_headers(user_id)
+    etag = fetch(client, "/users/me", headers).headers["ETag"]
+
+    login(client, f"{user_id}@example.com")
+    client.portal.call(activity.buffer.flush)
+    principal_cache.cache.invalidate(user_id)
+
+    assert fetch(client, "/users/me", headers, etag).status_code == 304
@@ -0,0 +1,37 @@
+import pytest
+
+import metrics
+from conftest import auth_headers
+
+ADMIN_ONLY = [
+    "/health/hashing", "/health/logging", "/health/outbox", "/health/principal-cache",
+    "/health/rate-limit", "/health/activity", "/health/permissions", "/health/db",
+    "/health/replicas", "/health/revocation", "/health/queries",
+]
+
+
+def test_liveness_probe_is_open(client):
+    assert client.get("/health").json() == {"status": "ok"}
+
+
+@pytest.mark.parametrize("path", ADMIN_ONLY)
+def test_internal_health_endpoints_are_for_admins(client, create_user, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers=auth_headers(create_user(roles=["user"]))).status_code == 403
+    assert client.get(path, headers=auth_headers(create_user(roles=["admin"]))).status_code == 200
+
+
+def test_metrics_are_off_by_default(client):
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_scrapes_need_the_token(client, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-secret")
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert "authpro_http_request_duration_seconds" in response.text
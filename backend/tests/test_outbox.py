@@ -0,0 +1,23 @@
+from sqlalchemy import select
+
+import mailer
+from database import AsyncSessionLocal, engine
+from models import EmailOutbox
+
+
+def test_batch_outcomes_are_recorded_on_the_primary(client, replica, monkeypatch):
+    # The replica doesn't have the new message; recording the outcome there
+    # would leave it "sending" until the lease expires and then resend it
+    async def enqueue():
+        async with AsyncSessionLocal() as db:
+            message = mailer.enqueue_email(db, "someone@example.com", "Hello", "Hi there")
+            await db.commit()
+            return message.id
+
+    message_id = client.portal.call(enqueue)
+    monkeypatch.setattr(mailer.outbox_worker, "_send_batch", lambda batch: {row[0]: None for row in batch})
+
+    assert client.portal.call(mailer.outbox_worker.process_batch) >= 1
+
+    with engine.connect() as conn:
+        assert conn.execute(select(EmailOutbox.status).where(EmailOutbox.id == message_id)).scalar_one() == "sent"
@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import delete, insert, select
+
+import auth
+import permissions
+from conftest import auth_headers
+from database import engine
+from models import Permission, Role, role_permissions
+from principal_cache import Principal
+
+
+def test_require_permissions_forbids_users_without_the_permission(client, create_user):
+    user = auth_headers(create_user(roles=["user"]))
+
+    assert client.get("/users", headers=user).status_code == 403
+    assert client.get("/admin", headers=user).status_code == 403
+    assert client.post("/users/import", headers=user, content=b"").status_code == 403
+
+
+def test_require_permissions_admits_admins(client, create_user):
+    admin = auth_headers(create_user(roles=["admin"]))
+
+    assert client.get("/users", headers=admin).status_code == 200
+    assert client.get("/admin", headers=admin).status_code == 200
+
+
+def test_require_permissions_needs_a_token(client):
+    assert client.get("/users").status_code == 401
+
+
+def test_reading_other_profiles_needs_users_read(client, create_user):
+    user_id = create_user(roles=["user"])
+    other_id = create_user(roles=["user"])
+
+    assert client.get(f"/users/{other_id}", headers=auth_headers(user_id)).status_code == 403
+    assert client.get(f"/users/{user_id}", headers=auth_headers(user_id)).status_code == 200
+    assert client.get(f"/users/{other_id}", headers=auth_headers(create_user(roles=["admin"]))).status_code == 200
+
+
+def test_granted_permission_applies_after_reload(client, create_user):
+    user = auth_headers(create_user(roles=["user"]))
+    with engine.begin() as conn:
+        role_id = conn.execute(select(Role.id).where(Role.name == "user")).scalar_one()
+        permission_id = conn.execute(select(Permission.id).where(Permission.name == "users:list")).scalar_one()
+        conn.execute(insert(role_permissions), {"role_id": role_id, "permission_id": permission_id})
+    try:
+        client.portal.call(permissions.policy.reload)
+        assert client.get("/users", headers=user).status_code == 200
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(role_permissions).where(
+                role_permissions.c.role_id == role_id, role_permissions.c.permission_id == permission_id,
+            ))
+        client.portal.call(permissions.policy.reload)
+
+    assert client.get("/users", headers=user).status_code == 403
+
+
+def test_unknown_permission_names_are_rejected_up_front():
+    with pytest.raises(ValueError):
+        auth.require_permissions("users:teleport")
+
+
+def test_uncompiled_permission_is_never_granted(client):
+    principal = Principal(id="p", email="p@example.com", is_active=True, is_verified=True, role_names=["admin"])
+
+    assert principal.can("users:list")
+    assert permissions.policy.mask_of(["not:compiled"]) is None
+    assert not principal.has_permissions(None)
+    assert not principal.can("users:list", "not:compiled")
+
+
+def test_permission_grants_are_only_shown_to_admins(client, create_user):
+    assert client.get("/health/permissions").status_code == 401
+    assert client.get("/health/permissions", headers=auth_headers(create_user(roles=["user"]))).status_code == 403
+
+    response = client.get("/health/permissions", headers=auth_headers(create_user(roles=["admin"])))
+
+    assert response.status_code == 200
+    assert "users:list" in response.json()["roles"]["admin"]
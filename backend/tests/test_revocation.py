@@ -0,0 +1,122 @@
+import calendar
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+import revocation
+from conftest import PASSWORD, login
+from database import AsyncSessionLocal, engine
+from models import RevokedToken
+from revocation import BloomFilter
+
+NEW_PASSWORD = "different-password456"
+INTROSPECTION_AUTH = ("resource-server", "test-secret")
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_logout_revokes_only_that_token(client, create_user):
+    email = f"{create_user()}@example.com"
+    token = login(client, email)
+    other_device = login(client, email)
+    assert client.get("/users/me", headers=bearer(token)).status_code == 200
+
+    assert client.post("/logout", headers=bearer(token)).status_code == 200
+    client.cookies.clear()
+
+    assert client.get("/users/me", headers=bearer(token)).status_code == 401
+    assert client.get("/users/me", headers=bearer(other_device)).status_code == 200
+
+
+def test_password_change_revokes_every_token(client, create_user):
+    email = f"{create_user()}@example.com"
+    token = login(client, email)
+    other_device = login(client, email)
+
+    response = client.post(
+        "/users/change-password",
+        headers=bearer(token),
+        json={"current_password": PASSWORD, "new_password": NEW_PASSWORD, "confirm_password": NEW_PASSWORD},
+    )
+    assert response.status_code == 200, response.text
+    client.cookies.clear()
+
+    assert client.get("/users/me", headers=bearer(token)).status_code == 401
+    assert client.get("/users/me", headers=bearer(other_device)).status_code == 401
+    assert client.post("/token", data={"username": email, "password": PASSWORD}).status_code == 401
+
+    # Logging straight back in works, even within the same second
+    new_token = login(client, email, NEW_PASSWORD)
+    assert client.get("/users/me", headers=bearer(new_token)).status_code == 200
+
+
+def test_user_revocation_splits_tokens_at_the_millisecond(client, create_user):
+    user_id = create_user()
+
+    async def revoke():
+        async with AsyncSessionLocal() as db:
+            await revocation.denylist.revoke_user(db, user_id)
+            await db.commit()
+            return (await db.execute(select(RevokedToken.not_before).where(RevokedToken.key == f"user:{user_id}"))).scalar_one()
+
+    not_before = client.portal.call(revoke)
+    revoked_at_ms = calendar.timegm(not_before.timetuple()) * 1000 + not_before.microsecond // 1000
+
+    def payload(iat_ms):
+        return {"sub": user_id, "jti": f"jti-{iat_ms}", "iat": iat_ms // 1000, "iat_ms": iat_ms}
+
+    assert client.portal.call(revocation.denylist.is_revoked, payload(revoked_at_ms - 1))
+    assert not client.portal.call(revocation.denylist.is_revoked, payload(revoked_at_ms + 1))
+
+
+def test_revocations_are_confirmed_on_the_primary(client, replica):
+    # The replica has none of the primary's rows, so a confirmation read
+    # there would call a revoked token valid
+    payload = {"sub": "nobody", "jti": "revoked-on-primary", "iat": 0, "exp": (datetime.utcnow() + timedelta(minutes=5)).timestamp()}
+
+    async def revoke():
+        async with AsyncSessionLocal() as db:
+            await revocation.denylist.revoke_token(db, payload)
+            await db.commit()
+
+    client.portal.call(revoke)
+
+    assert client.portal.call(revocation.denylist.is_revoked, payload)
+
+
+def test_sync_reads_other_workers_revocations_from_the_primary(client, replica):
+    key = revocation.jti_key("revoked-by-another-worker")
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(RevokedToken.__table__), {"key": key, "revoked_at": now, "expires_at": now + timedelta(minutes=5)})
+
+    client.portal.call(revocation.denylist.sync)
+
+    assert key in revocation.denylist.bloom
+
+
+def test_introspection_reports_revoked_tokens_inactive(client, create_user):
+    token = login(client, f"{create_user()}@example.com")
+
+    active = client.post("/introspect", data={"token": token}, auth=INTROSPECTION_AUTH).json()
+    assert active["active"] is True
+    assert isinstance(active["iat"], int)
+
+    client.post("/logout", headers=bearer(token))
+    client.cookies.clear()
+
+    assert client.post("/introspect", data={"token": token}, auth=INTROSPECTION_AUTH).json() == {"active": False}
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [f"jti:{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"jti:other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
@@ -0,0 +1,128 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import select, update
+
+import database
+import users
+from conftest import TEST_DIR
+from database import AsyncSessionLocal, ReplicaSet, use_primary
+from models import User
+from principal_cache import Principal
+
+PRIMARY = database.async_engine.sync_engine
+
+
+def new_session():
+    return AsyncSessionLocal().sync_session
+
+
+def test_reads_go_to_the_replica(replica):
+    session = new_session()
+
+    assert session.get_bind(clause=select(User)) is replica
+    # and stay there for the rest of the session
+    assert session.get_bind(clause=select(User.id)) is replica
+
+
+def test_dml_goes_to_the_primary_and_sticks(replica):
+    session = new_session()
+
+    assert session.get_bind(clause=update(User).values(first_name="x")) is PRIMARY
+    assert session.get_bind(clause=select(User)) is PRIMARY
+
+
+def test_select_for_update_goes_to_the_primary(replica):
+    session = new_session()
+
+    assert session.get_bind(clause=select(User).with_for_update()) is PRIMARY
+
+
+def test_dirty_session_reads_from_the_primary(replica):
+    session = new_session()
+    session.add(User(email="pending@example.com"))
+
+    assert session.get_bind(clause=select(User)) is PRIMARY
+
+
+def test_explicit_connection_goes_to_the_primary(replica):
+    # Session.connection() calls get_bind() without a clause
+    session = new_session()
+
+    assert session.get_bind() is PRIMARY
+    assert session.get_bind(clause=select(User)) is PRIMARY
+
+
+def test_use_primary_pins_the_session(replica):
+    db = use_primary(AsyncSessionLocal())
+
+    assert db.sync_session.get_bind(clause=select(User)) is PRIMARY
+
+
+def test_reads_fall_back_to_the_primary_without_a_healthy_replica(monkeypatch):
+    # The directory doesn't exist, so the health check can't connect
+    replica_set = ReplicaSet([f"sqlite:///{os.path.join(TEST_DIR, 'missing', 'replica.db')}"])
+
+    async def check():
+        await replica_set.check()
+        await replica_set.stop()
+
+    asyncio.run(check())
+    monkeypatch.setattr(database, "replicas", replica_set)
+
+    assert new_session().get_bind(clause=select(User)) is PRIMARY
+    assert replica_set.fallbacks == 1
+
+
+def test_without_replicas_everything_uses_the_primary():
+    session = new_session()
+
+    assert session.use_primary
+    assert session.get_bind(clause=select(User)) is PRIMARY
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    """A single-connection SQLite writer, as under SQLITE_PROFILE=production; returns its async engine."""
+    writer_engine = database.create_request_engine(
+        database.ASYNC_SQLALCHEMY_DATABASE_URL, label="writer", pool_size=1, max_overflow=0,
+    )
+    monkeypatch.setattr(database, "writer_engine", writer_engine)
+    return writer_engine
+
+
+def test_pinned_reads_do_not_take_the_writer(writer):
+    db = use_primary(AsyncSessionLocal())
+
+    assert db.sync_session.get_bind(clause=select(User)) is PRIMARY
+
+
+def test_writes_take_the_writer_until_the_transaction_ends(writer):
+    async def run():
+        try:
+            async with AsyncSessionLocal() as db:
+                session = db.sync_session
+                await db.execute(update(User).where(User.id == "nobody").values(first_name="x"))
+                # Reads in the same transaction see its writes
+                assert session.get_bind(clause=select(User)) is writer.sync_engine
+                await db.commit()
+                assert session.get_bind(clause=select(User)) is PRIMARY
+                assert writer.pool.checkedout() == 0
+        finally:
+            await writer.dispose()
+
+    asyncio.run(run())
+
+
+
+def test_verify_email_reads_the_user_from_the_primary(client, create_user, replica):
+    user_id = create_user(is_verified=False)
+    unverified = Principal(id=user_id, email=f"{user_id}@example.com", is_active=True, is_verified=False, role_names=[])
+    token = users.generate_verification_token(unverified)
+
+    response = client.post("/users/verify-email", json={"token": token})
+
+    assert response.status_code == 200, response.text
+    # The token is single-use: its nonce covered the unverified state
+    assert client.post("/users/verify-email", json={"token": token}).status_code == 400
@@ -0,0 +1,57 @@
+import uuid
+from datetime import datetime
+
+from conftest import auth_headers
+
+
+def list_all(client, headers, **params):
+    """Follow next_cursor to the end; returns the pages' ids in order."""
+    pages = []
+    cursor = None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        response = client.get("/users", headers=headers, params=query)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        pages.append([user["id"] for user in page["items"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_pages_through_created_at_ties(client, create_user):
+    admin = auth_headers(create_user(roles=["admin"]))
+    # Tag the users with a provider of their own so other tests' users don't show up
+    provider = f"keyset-{uuid.uuid4().hex}"
+    tied = datetime(2024, 1, 1, 12, 0, 0)
+    ids = [create_user(oauth_provider=provider, created_at=tied) for _ in range(7)]
+    newer = create_user(oauth_provider=provider, created_at=datetime(2024, 1, 2))
+
+    pages = list_all(client, admin, oauth_provider=provider, limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 2]
+    listed = [user_id for page in pages for user_id in page]
+    # Newest first, then id descending within the tie; nothing skipped or repeated
+    assert listed == [newer] + sorted(ids, reverse=True)
+
+
+def test_last_page_has_no_cursor(client, create_user):
+    admin = auth_headers(create_user(roles=["admin"]))
+    provider = f"keyset-{uuid.uuid4().hex}"
+    create_user(oauth_provider=provider)
+    create_user(oauth_provider=provider)
+
+    response = client.get("/users", headers=admin, params={"oauth_provider": provider, "limit": 2, "total": "exact"})
+
+    page = response.json()
+    assert len(page["items"]) == 2
+    assert page["next_cursor"] is None
+    assert page["total"] == 2
+
+
+def test_rejects_malformed_cursor(client, create_user):
+    admin = auth_headers(create_user(roles=["admin"]))
+
+    response = client.get("/users", headers=admin, params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
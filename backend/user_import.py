@@ -0,0 +1,246 @@
+import json
+import logging
+import os
+import uuid
+from typing import List, Optional
+
+from pydantic import BaseModel, EmailStr, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+
+from models import User, Role, user_roles
+from hashing import pwd_context
+import hashing
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Import settings
+# Rows are validated, de-duplicated, hashed and inserted this many at a time,
+# with one commit per batch
+USER_IMPORT_BATCH_SIZE = int(os.getenv("USER_IMPORT_BATCH_SIZE", "1000"))
+# Same rule as UserCreate
+MIN_PASSWORD_LENGTH = 8
+
+USER_COLUMNS = ("id", "email", "hashed_password", "first_name", "last_name", "is_active", "is_verified", "oauth_provider", "oauth_id")
+
+
+class ImportUser(BaseModel):
+    """
+    One NDJSON line. Give either `password` (hashed here) or `hashed_password`
+    (a hash this app can verify, e.g. bcrypt from the source system). OAuth
+    accounts may have neither.
+    """
+    email: EmailStr
+    password: Optional[str] = None
+    hashed_password: Optional[str] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    is_active: bool = True
+    is_verified: bool = False
+    oauth_provider: Optional[str] = None
+    oauth_id: Optional[str] = None
+    roles: List[str] = ["user"]
+
+
+def parse_line(line: bytes, role_ids: dict):
+    """Returns (row, error). row is None when the line can't be parsed at all."""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None, "Invalid JSON"
+    if not isinstance(data, dict):
+        return None, "Expected a JSON object"
+    try:
+        row = ImportUser(**data)
+    except ValidationError as exc:
+        error = exc.errors()[0]
+        return None, f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+
+    return row, validate_row(row, role_ids)
+
+
+def validate_row(row: ImportUser, role_ids: dict):
+    if row.password is not None and row.hashed_password is not None:
+        return "Give either password or hashed_password, not both"
+    if row.password is None and row.hashed_password is None and not row.oauth_provider:
+        return "password or hashed_password is required"
+    if row.password is not None and len(row.password) < MIN_PASSWORD_LENGTH:
+        return f"Password must be at least {MIN_PASSWORD_LENGTH} characters long"
+    if row.hashed_password is not None and pwd_context.identify(row.hashed_password, required=False) is None:
+        return "Unsupported password hash format"
+    unknown = [name for name in row.roles if name not in role_ids]
+    if unknown:
+        return f"Unknown role: {unknown[0]}"
+    return None
+
+
+async def iter_lines(chunks):
+    """Split an async stream of byte chunks into (line number, line), skipping blank lines."""
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, line
+    if buffer.strip():
+        yield line_no + 1, buffer
+
+
+async def copy_rows(db: AsyncSession, users, links):
+    """
+    COPY the batch into users and user_roles (PostgreSQL/asyncpg). COPY goes
+    around SQLAlchemy, so a unique violation is re-raised as IntegrityError
+    like the executemany path would raise it.
+    """
+    from asyncpg.exceptions import UniqueViolationError
+
+    connection = await db.connection()
+    raw = await connection.get_raw_connection()
+    driver = raw.driver_connection
+    try:
+        await driver.copy_records_to_table(
+            User.__table__.name,
+            records=[tuple(user[column] for column in USER_COLUMNS) for user in users],
+            columns=list(USER_COLUMNS),
+        )
+        if links:
+            await driver.copy_records_to_table(
+                user_roles.name,
+                records=[(link["user_id"], link["role_id"]) for link in links],
+                columns=["user_id", "role_id"],
+            )
+    except UniqueViolationError as exc:
+        raise IntegrityError(f"COPY {exc.table_name or User.__table__.name}", None, exc) from exc
+
+
+async def insert_rows(db: AsyncSession, users, links):
+    if db.bind.dialect.name == "postgresql":
+        await copy_rows(db, users, links)
+        return
+    # executemany; created_at/updated_at come from the server defaults
+    await db.execute(insert(User.__table__), users)
+    if links:
+        await db.execute(insert(user_roles), links)
+
+
+async def existing_emails(db: AsyncSession, emails):
+    result = await db.execute(select(User.email).where(User.email.in_(emails)))
+    return set(result.scalars())
+
+
+class ImportReport:
+    def __init__(self):
+        self.results = []
+        self.created = 0
+        self.duplicates = 0
+        self.invalid = 0
+
+    def add(self, line_no: int, email, status: str, **fields):
+        self.results.append(dict(line=line_no, email=email, status=status, **fields))
+        if status == "created":
+            self.created += 1
+        elif status == "duplicate":
+            self.duplicates += 1
+        else:
+            self.invalid += 1
+
+    def as_dict(self):
+        return {
+            "total": len(self.results),
+            "created": self.created,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "results": sorted(self.results, key=lambda result: result["line"]),
+        }
+
+
+class UserImporter:
+    """Imports NDJSON users in batches; see ImportUser for the line format."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.report = ImportReport()
+        self.role_ids = {}
+        # Emails seen earlier in this upload
+        self.seen = set()
+
+    async def run(self, chunks):
+        result = await self.db.execute(select(Role.id, Role.name))
+        self.role_ids = {name: role_id for role_id, name in result.all()}
+
+        batch = []
+        async for line_no, line in iter_lines(chunks):
+            row, error = parse_line(line, self.role_ids)
+            if error:
+                self.report.add(line_no, row.email if row else None, "invalid", error=error)
+                continue
+            if row.email in self.seen:
+                self.report.add(line_no, row.email, "duplicate", error="Duplicate email in upload")
+                continue
+            self.seen.add(row.email)
+            batch.append((line_no, row))
+            if len(batch) >= USER_IMPORT_BATCH_SIZE:
+                await self.flush(batch)
+                batch = []
+        if batch:
+            await self.flush(batch)
+
+        logger.info(
+            "User import finished: %s created, %s duplicates, %s invalid",
+            self.report.created, self.report.duplicates, self.report.invalid,
+        )
+        return self.report.as_dict()
+
+    async def flush(self, batch, retry: bool = True):
+        # One set-based lookup for the whole batch
+        existing = await existing_emails(self.db, [row.email for _, row in batch])
+        new_rows = []
+        for line_no, row in batch:
+            if row.email in existing:
+                self.report.add(line_no, row.email, "duplicate", error="Email already registered")
+            else:
+                new_rows.append((line_no, row))
+        if not new_rows:
+            return
+
+        to_hash = [row.password for _, row in new_rows if row.password is not None]
+        hashes = iter(await hashing.hash_passwords_bulk(to_hash)) if to_hash else iter(())
+
+        users, links = [], []
+        for _, row in new_rows:
+            user_id = str(uuid.uuid4())
+            users.append({
+                "id": user_id,
+                "email": row.email,
+                "hashed_password": next(hashes) if row.password is not None else row.hashed_password,
+                "first_name": row.first_name,
+                "last_name": row.last_name,
+                "is_active": row.is_active,
+                "is_verified": row.is_verified,
+                "oauth_provider": row.oauth_provider,
+                "oauth_id": row.oauth_id,
+            })
+            links.extend({"user_id": user_id, "role_id": self.role_ids[name]} for name in set(row.roles))
+
+        try:
+            await insert_rows(self.db, users, links)
+            await self.db.commit()
+        except IntegrityError:
+            # Someone registered one of these emails since the lookup; redo
+            # the batch once, which will now report it as a duplicate
+            await self.db.rollback()
+            if not retry:
+                raise
+            await self.flush(new_rows, retry=False)
+            return
+
+        for (line_no, row), user in zip(new_rows, users):
+            self.report.add(line_no, row.email, "created", id=user["id"])
@@ -1,5 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, func, literal, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
 try:
     # Pydantic V2
@@ -10,23 +13,35 @@ except ImportError:
     from pydantic import BaseModel, EmailStr, validator
     field_validator = validator
     USE_PYDANTIC_V2 = False
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
-import uuid
+import base64
+import csv
+import hashlib
+import hmac
+import io
+import json
+import logging
 import os
-import smtplib
-from email.message import EmailMessage
 from dotenv import load_dotenv
+from itsdangerous import BadSignature, URLSafeTimedSerializer
 
-from database import get_db
-from models import User, Role
+from database import AsyncSessionLocal, get_async_db, get_primary_db
+from models import User, Role, RefreshToken
+from principal_cache import Principal
+from hashing import pwd_context
 import auth
+import hashing
+import mailer
+import user_import
+import principal_cache
+import ratelimit
+import revocation
+import serialization
 
 # Load environment variables
 load_dotenv()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
 # Router setup
 router = APIRouter(
@@ -36,13 +51,6 @@ router = APIRouter(
 
 # Email verification settings
 VERIFICATION_TOKEN_EXPIRY_HOURS = int(os.getenv("VERIFICATION_TOKEN_EXPIRY_HOURS", "24"))
-# Hardcoded values for SMTP to ensure they work even if env vars aren't loading properly
-SMTP_SERVER = "smtp.gmail.com"  # Hardcoded instead of using env var
-SMTP_PORT = 465  # Gmail SSL port
-EMAIL_FROM = "kemo3855@gmail.com"  # Hardcoded Gmail address
-EMAIL_FROM_NAME = "AuthPro"
-SMTP_USERNAME = "kemo3855@gmail.com"  # Hardcoded Gmail username
-SMTP_PASSWORD = "bmhv cwln qigw vzhc"  # Gmail app password
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
 # Pydantic models for request/response
@@ -87,6 +95,7 @@ class UserResponse(UserBase):
     id: str
     is_active: bool = True
     is_verified: bool = False
+    oauth_provider: Optional[str] = None
     created_at: datetime
     roles: List[RoleResponse] = []
     
@@ -117,6 +126,17 @@ class UserResponse(UserBase):
             # Ensure roles is always a list even if None
             return v or []
 
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    # Pass back as `cursor` to get the next page; null on the last page
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+    total_is_approximate: bool = False
+
+# Responses are built with these rather than through FastAPI's response_model
+# pass; the models still document the endpoints
+serialize_user = serialization.compile_serializer(UserResponse)
+
 class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
     first_name: Optional[str] = None
@@ -173,198 +193,335 @@ class ChangePasswordRequest(BaseModel):
             return v
 
 # Helper functions
-def get_user(db: Session, user_id: str):
-    return db.query(User).filter(User.id == user_id).first()
+# Roles are needed by responses and permission checks and can't be lazy-loaded
+# on an async session, so user queries always load them eagerly
+def select_users():
+    return select(User).options(selectinload(User.roles))
+
+async def get_user(db: AsyncSession, user_id: str):
+    result = await db.execute(select_users().where(User.id == user_id))
+    return result.scalar_one_or_none()
+
+# Conditional GET: profile responses carry the user's weak ETag (see
+# Principal.etag) and a matching If-None-Match gets a 304 before the row is
+# loaded or serialized. Tags are checked against the principal cache, so
+# another worker's change can be missed for up to PRINCIPAL_CACHE_TTL_SECONDS.
+PROFILE_CACHE_CONTROL = "private, no-cache"
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison (RFC 9110) of `etag` against the request's If-None-Match."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in header.split(","))
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": PROFILE_CACHE_CONTROL})
+
+def profile_response(user: User) -> Response:
+    """Serialize a profile, tagged, and refresh the cached principal from the row just loaded."""
+    principal = Principal.from_user(user)
+    principal_cache.cache.set(principal)
+    return serialization.respond(
+        serialize_user(user),
+        headers={"ETag": principal.etag, "Cache-Control": PROFILE_CACHE_CONTROL},
+    )
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select_users().where(User.email == email))
+    return result.scalar_one_or_none()
+
+# Admin listing
+# Pages are keyed on (created_at, id), newest first, so each page is a range
+# scan of ix_users_created_at_id no matter how deep it is
+USER_LIST_MAX_LIMIT = 200
+# Below this estimated size an exact count is cheap enough to run instead
+APPROXIMATE_COUNT_THRESHOLD = 10000
+
+def encode_user_cursor(user) -> str:
+    raw = json.dumps([user.created_at.isoformat(), user.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_user_cursor(cursor: str):
+    """Returns (created_at, id), or None if the cursor is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, user_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(user_id)
+    except (ValueError, TypeError):
+        return None
+
+def user_filters(role: str = None, verified: bool = None, active: bool = None, oauth_provider: str = None):
+    filters = []
+    if role is not None:
+        filters.append(User.roles.any(Role.name == role))
+    if verified is not None:
+        filters.append(User.is_verified == verified)
+    if active is not None:
+        filters.append(User.is_active == active)
+    if oauth_provider is not None:
+        # "none" selects accounts without an OAuth login
+        if oauth_provider == "none":
+            filters.append(User.oauth_provider.is_(None))
+        else:
+            filters.append(User.oauth_provider == oauth_provider)
+    return filters
+
+async def get_users(db: AsyncSession, limit: int = 50, after=None, filters=()):
+    """One page of users, newest first. Returns (users, next_cursor)."""
+    query = select_users().where(*filters)
+    if after is not None:
+        created_at, user_id = after
+        # Bind with the column types so SQLite compares in its stored format
+        query = query.where(
+            tuple_(User.created_at, User.id)
+            < tuple_(literal(created_at, User.created_at.type), literal(user_id, User.id.type))
+        )
+    query = query.order_by(User.created_at.desc(), User.id.desc()).limit(limit + 1)
+    users = (await db.execute(query)).scalars().all()
+    next_cursor = encode_user_cursor(users[limit - 1]) if len(users) > limit else None
+    return users[:limit], next_cursor
+
+# Export
+# Rows are read through a server-side cursor in batches of this size; each
+# batch loads its roles with one query and is dropped from the session once
+# written, so memory use doesn't grow with the table
+USER_EXPORT_BATCH_SIZE = int(os.getenv("USER_EXPORT_BATCH_SIZE", "1000"))
+USER_EXPORT_FIELDS = list(UserResponse.__fields__)
+
+def export_user(user) -> dict:
+    """A user in the UserResponse shape."""
+    return UserResponse.from_orm(user).dict()
+
+def format_export_rows(rows, export_format: str) -> str:
+    if export_format == "ndjson":
+        return "".join(json.dumps(row, default=datetime.isoformat) + "\n" for row in rows)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=USER_EXPORT_FIELDS)
+    for row in rows:
+        row["created_at"] = row["created_at"].isoformat()
+        row["roles"] = ";".join(role["name"] for role in row["roles"])
+        writer.writerow(row)
+    return buffer.getvalue()
+
+async def stream_users_export(export_format: str, filters=()):
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, fieldnames=USER_EXPORT_FIELDS).writeheader()
+        yield buffer.getvalue()
+    
+    # Own session: it has to outlive the request handler while the body streams
+    async with AsyncSessionLocal() as db:
+        query = (
+            select_users()
+            .where(*filters)
+            .order_by(User.created_at, User.id)
+            .execution_options(yield_per=USER_EXPORT_BATCH_SIZE)
+        )
+        result = await db.stream(query)
+        async for batch in result.scalars().partitions():
+            yield format_export_rows([export_user(user) for user in batch], export_format)
+            for user in batch:
+                db.expunge(user)
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def estimate_rows(db: AsyncSession, query) -> int:
+    """PostgreSQL planner estimate for a query; reads statistics, not the table."""
+    sql = str(query.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True}))
+    # Route by the query, or the bare connection() would go to the primary
+    connection = await db.connection(bind_arguments={"clause": query})
+    plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(User).offset(skip).limit(limit).all()
+async def count_users(db: AsyncSession, filters=(), approximate: bool = False):
+    """Returns (count, is_approximate)."""
+    if approximate and db.bind.dialect.name == "postgresql":
+        estimate = await estimate_rows(db, select(User.id).where(*filters))
+        if estimate >= APPROXIMATE_COUNT_THRESHOLD:
+            return estimate, True
+    result = await db.execute(select(func.count()).select_from(User).where(*filters))
+    return result.scalar_one(), False
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = get_user_by_email(db, email)
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await get_user_by_email(db, email)
     if not user or not user.hashed_password:
         return False
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await hashing.verify_and_update_async(password, user.hashed_password)
+    if not verified:
         return False
+    if new_hash:
+        user.hashed_password = new_hash
     return user
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Hashing goes through the shared process pool so it never blocks the event loop
+async def verify_password(plain_password, hashed_password):
+    return await hashing.verify_password_async(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await hashing.get_password_hash_async(password)
 
 # Email verification functions
-def generate_verification_token(db: Session, user: User):
-    """Generate a new verification token for a user and save it to the database."""
-    token = str(uuid.uuid4())
-    expiry = datetime.utcnow() + timedelta(hours=VERIFICATION_TOKEN_EXPIRY_HOURS)
-    
-    user.verification_token = token
-    user.verification_token_expires_at = expiry
-    db.commit()
-    
-    return token
+# Verification tokens are signed and self-contained (user id, issue time and a
+# per-user nonce), so minting one needs no write and checking one needs at most
+# a primary-key lookup.
+verification_serializer = URLSafeTimedSerializer(auth.SECRET_KEY, salt="email-verification")
+
+def verification_nonce(user) -> str:
+    """
+    Nonce tied to the state a token was issued for: it changes once the email is
+    verified or changed, which invalidates every outstanding token for the user.
+    """
+    return hashlib.sha256(f"{user.email}:{bool(user.is_verified)}".encode()).hexdigest()[:16]
 
-def send_verification_email(user_email: str, token: str):
-    """Send a verification email with the given token."""
+def generate_verification_token(user) -> str:
+    """Generate a signed verification token for a user (a User or Principal)."""
+    return verification_serializer.dumps({"uid": user.id, "n": verification_nonce(user)})
+
+def load_verification_token(token: str):
+    """Return the token payload, or None if it is forged, malformed or expired."""
     try:
-        verification_url = f"{FRONTEND_URL}/verify-email?token={token}"
-        
-        # Create a professional HTML email template
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Verify Your Email</title>
-            <style>
-                body {{
-                    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                    line-height: 1.6;
-                    color: #333333;
-                    margin: 0;
-                    padding: 0;
-                    background-color: #f9f9f9;
-                }}
-                .container {{
-                    max-width: 600px;
-                    margin: 0 auto;
-                    padding: 20px;
-                    background-color: #ffffff;
-                    border-radius: 5px;
-                    box-shadow: 0 2px 5px rgba(0, 0, 0, 0.1);
-                }}
-                .header {{
-                    text-align: center;
-                    padding: 20px 0;
-                    border-bottom: 1px solid #f0f0f0;
-                }}
-                .logo {{
-                    color: #4F46E5;
-                    font-size: 28px;
-                    font-weight: 700;
-                    text-decoration: none;
-                }}
-                .content {{
-                    padding: 30px 20px;
-                }}
-                .verify-button {{
-                    display: inline-block;
-                    background-color: #4F46E5;
-                    color: white;
-                    text-decoration: none;
-                    padding: 12px 24px;
-                    border-radius: 5px;
-                    font-weight: 600;
-                    margin: 20px 0;
-                    text-align: center;
-                }}
-                .footer {{
-                    text-align: center;
-                    padding: 20px;
-                    color: #888888;
-                    font-size: 12px;
-                    border-top: 1px solid #f0f0f0;
-                }}
-                .expiry-info {{
-                    color: #666666;
-                    font-size: 14px;
-                    margin-top: 20px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <div class="logo">AuthPro</div>
-                </div>
-                <div class="content">
-                    <h2>Verify Your Email Address</h2>
-                    <p>Hello,</p>
-                    <p>Thank you for signing up with AuthPro. Please verify your email address by clicking the button below:</p>
-                    
-                    <div style="text-align: center;">
-                        <a href="{verification_url}" class="verify-button">Verify Email</a>
-                    </div>
-                    
-                    <p>If the button doesn't work, you can also verify by copying and pasting this link into your browser:</p>
-                    <p style="word-break: break-all; font-size: 14px;"><a href="{verification_url}">{verification_url}</a></p>
-                    
-                    <p class="expiry-info">This link will expire in {VERIFICATION_TOKEN_EXPIRY_HOURS} hours.</p>
-                    
-                    <p>If you did not sign up for an AuthPro account, you can safely ignore this email.</p>
-                    <p>Best regards,<br>The AuthPro Team</p>
-                </div>
-                <div class="footer">
-                    &copy; {datetime.utcnow().year} AuthPro. All rights reserved.<br>
-                    This is an automated message, please do not reply.
+        payload = verification_serializer.loads(token, max_age=VERIFICATION_TOKEN_EXPIRY_HOURS * 3600)
+    except BadSignature:
+        return None
+    if not isinstance(payload, dict) or "uid" not in payload or "n" not in payload:
+        return None
+    return payload
+
+def render_verification_email(token: str):
+    """Build the (subject, plain text, html) of a verification email."""
+    verification_url = f"{FRONTEND_URL}/verify-email?token={token}"
+    
+    # Create a professional HTML email template
+    html_content = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Verify Your Email</title>
+        <style>
+            body {{
+                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                line-height: 1.6;
+                color: #333333;
+                margin: 0;
+                padding: 0;
+                background-color: #f9f9f9;
+            }}
+            .container {{
+                max-width: 600px;
+                margin: 0 auto;
+                padding: 20px;
+                background-color: #ffffff;
+                border-radius: 5px;
+                box-shadow: 0 2px 5px rgba(0, 0, 0, 0.1);
+            }}
+            .header {{
+                text-align: center;
+                padding: 20px 0;
+                border-bottom: 1px solid #f0f0f0;
+            }}
+            .logo {{
+                color: #4F46E5;
+                font-size: 28px;
+                font-weight: 700;
+                text-decoration: none;
+            }}
+            .content {{
+                padding: 30px 20px;
+            }}
+            .verify-button {{
+                display: inline-block;
+                background-color: #4F46E5;
+                color: white;
+                text-decoration: none;
+                padding: 12px 24px;
+                border-radius: 5px;
+                font-weight: 600;
+                margin: 20px 0;
+                text-align: center;
+            }}
+            .footer {{
+                text-align: center;
+                padding: 20px;
+                color: #888888;
+                font-size: 12px;
+                border-top: 1px solid #f0f0f0;
+            }}
+            .expiry-info {{
+                color: #666666;
+                font-size: 14px;
+                margin-top: 20px;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <div class="logo">AuthPro</div>
+            </div>
+            <div class="content">
+                <h2>Verify Your Email Address</h2>
+                <p>Hello,</p>
+                <p>Thank you for signing up with AuthPro. Please verify your email address by clicking the button below:</p>
+                
+                <div style="text-align: center;">
+                    <a href="{verification_url}" class="verify-button">Verify Email</a>
                 </div>
+                
+                <p>If the button doesn't work, you can also verify by copying and pasting this link into your browser:</p>
+                <p style="word-break: break-all; font-size: 14px;"><a href="{verification_url}">{verification_url}</a></p>
+                
+                <p class="expiry-info">This link will expire in {VERIFICATION_TOKEN_EXPIRY_HOURS} hours.</p>
+                
+                <p>If you did not sign up for an AuthPro account, you can safely ignore this email.</p>
+                <p>Best regards,<br>The AuthPro Team</p>
             </div>
-        </body>
-        </html>
-        """
-        
-        # Create a plain text version as fallback
-        plain_text = f"""
-        Hello,
-        
-        Thank you for signing up with AuthPro. Please verify your email address by clicking the link below:
-        
-        {verification_url}
-        
-        This link will expire in {VERIFICATION_TOKEN_EXPIRY_HOURS} hours.
-        
-        If you did not sign up for this account, you can ignore this email.
-        
-        Best regards,
-        The AuthPro Team
-        """
-        
-        # Debug settings
-        print(f"\n=== EMAIL CONFIGURATION ===")
-        print(f"SMTP_SERVER: {SMTP_SERVER}")
-        print(f"SMTP_PORT: {SMTP_PORT}")
-        print(f"SMTP_USERNAME: {SMTP_USERNAME}")
-        print(f"EMAIL_FROM: {EMAIL_FROM}")
-        
-        msg = EmailMessage()
-        msg.set_content(plain_text)
-        msg.add_alternative(html_content, subtype='html')
-        
-        msg['Subject'] = 'Verify your AuthPro account'
-        formatted_from = f"{EMAIL_FROM_NAME} <{EMAIL_FROM}>"
-        msg['From'] = formatted_from
-        msg['To'] = user_email
-        
-        # Simplified Gmail handling - just use SSL
-        print(f"Attempting to connect to Gmail via SSL...")
-        import ssl
-        context = ssl.create_default_context()
-        
-        with smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, context=context) as server:
-            print(f"SSL connection established, logging in with {SMTP_USERNAME}")
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            print(f"Sending email to: {user_email}")
-            server.send_message(msg)
-            print(f"Verification email sent successfully to {user_email}")
-        
-        return True
-            
-    except Exception as e:
-        import traceback
-        print(f"ERROR sending verification email: {str(e)}")
-        print("Traceback:")
-        traceback.print_exc()
-        return False
+            <div class="footer">
+                &copy; {datetime.utcnow().year} AuthPro. All rights reserved.<br>
+                This is an automated message, please do not reply.
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    # Create a plain text version as fallback
+    plain_text = f"""
+    Hello,
+    
+    Thank you for signing up with AuthPro. Please verify your email address by clicking the link below:
+    
+    {verification_url}
+    
+    This link will expire in {VERIFICATION_TOKEN_EXPIRY_HOURS} hours.
+    
+    If you did not sign up for this account, you can ignore this email.
+    
+    Best regards,
+    The AuthPro Team
+    """
+
+    return "Verify your AuthPro account", plain_text, html_content
+
+def queue_verification_email(db: AsyncSession, user_email: str, token: str):
+    """Add a verification email to the outbox; it is sent after the caller commits."""
+    subject, plain_text, html_content = render_verification_email(token)
+    mailer.enqueue_email(db, user_email, subject, plain_text, html_content)
 
 # Endpoints
-@router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = get_user_by_email(db, user.email)
+@router.post(
+    "/",
+    response_model=UserResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(ratelimit.limit("register", email_field="email"))],
+)
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_primary_db)):
+    db_user = await get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -372,7 +529,7 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     db_user = User(
         email=user.email,
         hashed_password=hashed_password,
@@ -382,32 +539,110 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     )
     
     # Add default role
-    default_role = db.query(Role).filter(Role.name == "user").first()
+    result = await db.execute(select(Role).where(Role.name == "user"))
+    default_role = result.scalars().first()
     if default_role:
         db_user.roles.append(default_role)
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    
-    # Generate verification token and send email
-    try:
-        token = generate_verification_token(db, db_user)
-        send_verification_email(db_user.email, token)
-    except Exception as e:
-        print(f"Error sending verification email: {str(e)}")
-        # Continue even if email fails - user is still created
+    # Flush to get the user id for the token, then commit the user and the
+    # queued verification email together
+    await db.flush()
+    queue_verification_email(db, db_user.email, generate_verification_token(db_user))
+    await db.commit()
+    mailer.outbox_worker.notify()
+    
+    return serialization.respond(serialize_user(db_user), status_code=status.HTTP_201_CREATED)
+
+@router.get("", response_model=UserPage)
+@router.get("/", response_model=UserPage, include_in_schema=False)
+async def list_users(
+    limit: int = Query(50, ge=1, le=USER_LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    role: Optional[str] = None,
+    verified: Optional[bool] = None,
+    active: Optional[bool] = None,
+    oauth_provider: Optional[str] = None,
+    total: Optional[str] = Query(None, regex="^(exact|approximate)$"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(auth.require_permissions("users:list"))
+):
+    """
+    List users, newest first (admin only). Pass `next_cursor` from a page as
+    `cursor` to get the next one. `total=exact|approximate` adds a count; the
+    approximate one comes from planner statistics on large PostgreSQL tables.
+    """
+    after = None
+    if cursor:
+        after = decode_user_cursor(cursor)
+        if after is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
     
-    return db_user
+    filters = user_filters(role=role, verified=verified, active=active, oauth_provider=oauth_provider)
+    users, next_cursor = await get_users(db, limit=limit, after=after, filters=filters)
+    
+    page = {
+        "items": [serialize_user(user) for user in users],
+        "next_cursor": next_cursor,
+        "total": None,
+        "total_is_approximate": False,
+    }
+    if total:
+        page["total"], page["total_is_approximate"] = await count_users(db, filters, approximate=total == "approximate")
+    return serialization.respond(page)
+
+@router.get("/export")
+async def export_users(
+    export_format: str = Query("ndjson", alias="format", regex="^(ndjson|csv)$"),
+    role: Optional[str] = None,
+    verified: Optional[bool] = None,
+    active: Optional[bool] = None,
+    oauth_provider: Optional[str] = None,
+    current_user: Principal = Depends(auth.require_permissions("users:list"))
+):
+    """Stream every matching user, with roles, as NDJSON or CSV (admin only)."""
+    filters = user_filters(role=role, verified=verified, active=active, oauth_provider=oauth_provider)
+    media_type = "application/x-ndjson" if export_format == "ndjson" else "text/csv"
+    filename = f"users-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{export_format}"
+    return StreamingResponse(
+        stream_users_export(export_format, filters),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/import")
+async def import_users(
+    request: Request,
+    db: AsyncSession = Depends(get_primary_db),
+    current_user: Principal = Depends(auth.require_permissions("users:import"))
+):
+    """
+    Bulk-create users from an NDJSON request body (admin only), one object per
+    line as described by user_import.ImportUser. Imported users get no
+    verification email. Returns a per-line report.
+    """
+    return await user_import.UserImporter(db).run(request.stream())
 
 @router.get("/me", response_model=UserResponse)
-def read_users_me(request: Request, current_user: User = Depends(auth.get_current_user)):
-    print(f"GET /users/me - Headers: {dict(request.headers)}")
-    print(f"GET /users/me - Cookies: {request.cookies}")
+async def read_users_me(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(auth.get_current_principal)
+):
+    # Unchanged profile: answer from the cached principal without touching the row
+    if etag_matches(request, principal.etag):
+        return not_modified(principal.etag)
+    
+    # db.get() reuses the row verify_token just loaded on a cache miss
+    current_user = await db.get(User, principal.id, options=[selectinload(User.roles)])
     
     # Add some validation and debugging to make sure we return a valid user
     try:
         if not current_user:
+            principal_cache.cache.invalidate(principal.id)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not authenticated",
@@ -415,7 +650,7 @@ def read_users_me(request: Request, current_user: User = Depends(auth.get_curren
             
         # Ensure required fields exist
         if not hasattr(current_user, 'id') or not current_user.id:
-            print("User missing id field")
+            logger.error("Authenticated user has no id")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Invalid user data: missing id",
@@ -423,55 +658,56 @@ def read_users_me(request: Request, current_user: User = Depends(auth.get_curren
             
         # Ensure user has roles list
         if not hasattr(current_user, 'roles') or current_user.roles is None:
-            print("User missing roles, setting empty list")
             current_user.roles = []
             
-        print(f"Returning user data for {current_user.email}")
-        return current_user
+        return profile_response(current_user)
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in /users/me: {str(e)}")
+        logger.exception("Error in /users/me")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error retrieving user data: {str(e)}",
         )
 
 @router.get("/{user_id}", response_model=UserResponse)
-def read_user(
+async def read_user(
     user_id: str, 
     request: Request,
-    db: Session = Depends(get_db), 
-    current_user: User = Depends(auth.get_current_user)
+    db: AsyncSession = Depends(get_async_db), 
+    current_user: Principal = Depends(auth.get_current_principal)
 ):
-    # Check if user has admin role
-    is_admin = any(role.name == "admin" for role in current_user.roles)
-    
-    # Only allow users to access their own data unless they're admin
-    if user_id != current_user.id and not is_admin:
+    # Only allow users to access their own data unless they hold users:read
+    if user_id != current_user.id and not current_user.can("users:read"):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    db_user = get_user(db, user_id)
+    cached = current_user if user_id == current_user.id else principal_cache.cache.get(user_id)
+    if cached is not None and etag_matches(request, cached.etag):
+        return not_modified(cached.etag)
+    
+    db_user = await get_user(db, user_id)
     if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    return db_user
+    return profile_response(db_user)
 
 @router.patch("/me", response_model=UserResponse)
-def update_user(
+async def update_user(
     user_update: UserUpdate,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_primary_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     # Update user details
     if user_update.email is not None:
         # Check if email is already taken
-        existing_user = get_user_by_email(db, user_update.email)
+        existing_user = await get_user_by_email(db, user_update.email)
         if existing_user and existing_user.id != current_user.id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -486,44 +722,43 @@ def update_user(
         current_user.last_name = user_update.last_name
         
     if user_update.password is not None:
-        current_user.hashed_password = get_password_hash(user_update.password)
+        current_user.hashed_password = await get_password_hash(user_update.password)
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    principal_cache.cache.invalidate(current_user.id)
     
-    return current_user
+    return serialization.respond(serialize_user(current_user))
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(
+async def delete_user(
     user_id: str,
     request: Request,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth.get_current_user)
+    db: AsyncSession = Depends(get_primary_db),
+    current_user: Principal = Depends(auth.get_current_principal)
 ):
-    # Check if user has admin role
-    is_admin = any(role.name == "admin" for role in current_user.roles)
-    
-    # Only allow users to delete their own account unless they're admin
-    if user_id != current_user.id and not is_admin:
+    # Only allow users to delete their own account unless they hold users:delete
+    if user_id != current_user.id and not current_user.can("users:delete"):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
     
-    db_user = get_user(db, user_id)
+    db_user = await get_user(db, user_id)
     if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    db.delete(db_user)
-    db.commit()
+    await db.delete(db_user)
+    await revocation.denylist.revoke_user(db, user_id)
+    await db.commit()
+    principal_cache.cache.invalidate(user_id)
     
     return None
 
 @router.post("/verify-email", status_code=status.HTTP_200_OK)
-def verify_email(token: dict, db: Session = Depends(get_db)):
+async def verify_email(token: dict, db: AsyncSession = Depends(get_primary_db)):
     """Verify a user's email address using a verification token."""
     verification_token = token.get("token")
     if not verification_token:
@@ -532,11 +767,11 @@ def verify_email(token: dict, db: Session = Depends(get_db)):
             detail="Verification token is required"
         )
     
-    # Find user with this token
-    user = db.query(User).filter(
-        User.verification_token == verification_token,
-        User.verification_token_expires_at > datetime.utcnow()
-    ).first()
+    # Check signature and expiry, then load the user by primary key
+    payload = load_verification_token(verification_token)
+    user = await db.get(User, payload["uid"]) if payload else None
+    if user and not hmac.compare_digest(payload["n"], verification_nonce(user)):
+        user = None
     
     if not user:
         raise HTTPException(
@@ -546,72 +781,44 @@ def verify_email(token: dict, db: Session = Depends(get_db)):
     
     # Mark user as verified
     user.is_verified = True
-    user.verification_token = None
-    user.verification_token_expires_at = None
-    db.commit()
+    await db.commit()
+    principal_cache.cache.invalidate(user.id)
     
     return {"message": "Email successfully verified"}
 
 @router.post("/resend-verification", status_code=status.HTTP_200_OK)
-def resend_verification(
+async def resend_verification(
     request: Request,
-    current_user: User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(auth.get_current_principal),
+    db: AsyncSession = Depends(get_primary_db)
 ):
     """Resend a verification email to the current user."""
-    # Log useful info for debugging
-    print(f"\n=== RESEND VERIFICATION REQUEST ===")
-    print(f"User email: {current_user.email}")
-    print(f"User ID: {current_user.id}")
-    print(f"Is verified: {current_user.is_verified}")
-    
     # Only allow for unverified users
     if current_user.is_verified:
-        print(f"User already verified: {current_user.email}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email is already verified"
         )
     
-    try:
-        # Generate new token
-        print(f"Generating verification token for user: {current_user.email}")
-        token = generate_verification_token(db, current_user)
-        print(f"Generated token: {token[:8]}...")
-        
-        # Send verification email
-        print(f"Attempting to send verification email to: {current_user.email}")
-        email_sent = send_verification_email(current_user.email, token)
-        
-        if not email_sent:
-            print(f"Failed to send verification email to {current_user.email}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to send verification email. Please try again later or contact support."
-            )
-        
-        print(f"Successfully sent verification email to: {current_user.email}")
-        return {"message": "Verification email sent", "success": True}
-    except Exception as e:
-        import traceback
-        print(f"ERROR in resend_verification: {str(e)}")
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Email service temporarily unavailable. Please try again later."
-        )
+    # Queue the email; the outbox worker sends it (and retries) in the background
+    token = generate_verification_token(current_user)
+    queue_verification_email(db, current_user.email, token)
+    await db.commit()
+    mailer.outbox_worker.notify()
+    logger.info("Queued verification email", extra={"event": "verification_resent", "user_id": current_user.id})
+    return {"message": "Verification email sent", "success": True}
 
 @router.post("/change-password", status_code=status.HTTP_200_OK)
-def change_password(
+async def change_password(
     password_data: ChangePasswordRequest,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_primary_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Change the user's password, requiring the current password for verification."""
     
     # Verify current password
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await verify_password(password_data.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
@@ -625,7 +832,11 @@ def change_password(
         )
     
     # Update password
-    current_user.hashed_password = get_password_hash(password_data.new_password)
-    db.commit()
+    current_user.hashed_password = await get_password_hash(password_data.new_password)
+    # Sign out everywhere: revoke outstanding access tokens and end all sessions
+    await revocation.denylist.revoke_user(db, current_user.id)
+    await db.execute(delete(RefreshToken).where(RefreshToken.user_id == current_user.id))
+    await db.commit()
+    principal_cache.cache.invalidate(current_user.id)
     
     return {"message": "Password changed successfully"}
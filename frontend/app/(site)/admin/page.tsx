@@ -2,7 +2,7 @@
 
 import { useState, useEffect } from "react";
 import { motion } from "framer-motion";
-import { useQuery } from "@tanstack/react-query";
+import { useInfiniteQuery, useQuery } from "@tanstack/react-query";
 import { toast } from "sonner";
 import { Users, Shield, Lock, User } from "lucide-react";
 
@@ -36,49 +36,58 @@ import {
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
 import { Switch } from "@/components/ui/switch";
+import {
+  Select,
+  SelectContent,
+  SelectItem,
+  SelectTrigger,
+  SelectValue,
+} from "@/components/ui/select";
 
 import AuthMiddleware from "@/lib/auth-middleware";
 import { useAuthStore, useIsAdmin } from "@/lib/store";
-import api from "@/lib/api";
+import api, { AdminUser, UserPage } from "@/lib/api";
+
+const PAGE_SIZE = 50;
+
+// "all" in a filter select means the filter is not applied
+interface UserFilters {
+  role?: string;
+  verified?: boolean;
+  active?: boolean;
+  oauth_provider?: string;
+}
+
+const toBoolean = (value: string) =>
+  value === "all" ? undefined : value === "true";
+
+// Count of users matching the filters, for the stats cards
+function useUserCount(filters: UserFilters, enabled: boolean) {
+  return useQuery({
+    queryKey: ["adminUserCount", filters],
+    queryFn: async () => {
+      const { data } = await api.listUsers({
+        ...filters,
+        limit: 1,
+        total: "approximate",
+      });
+      return data;
+    },
+    staleTime: 1000 * 60, // 1 minute
+    enabled,
+  });
+}
 
-// Mock user data
-const mockUsers = [
-  {
-    id: "1",
-    email: "admin@example.com",
-    first_name: "Admin",
-    last_name: "User",
-    is_verified: true,
-    is_active: true,
-    created_at: "2023-01-01T00:00:00Z",
-    roles: [{ name: "admin" }, { name: "user" }],
-  },
-  {
-    id: "2",
-    email: "john@example.com",
-    first_name: "John",
-    last_name: "Doe",
-    is_verified: true,
-    is_active: true,
-    created_at: "2023-01-02T00:00:00Z",
-    roles: [{ name: "user" }],
-  },
-  {
-    id: "3",
-    email: "jane@example.com",
-    first_name: "Jane",
-    last_name: "Smith",
-    is_verified: false,
-    is_active: true,
-    created_at: "2023-01-03T00:00:00Z",
-    roles: [{ name: "user" }],
-  },
-];
+const formatCount = (page?: UserPage) => {
+  if (!page || page.total === null) return "—";
+  return `${page.total_is_approximate ? "~" : ""}${page.total.toLocaleString()}`;
+};
 
 export default function AdminPage() {
   const { user } = useAuthStore();
   const isAdmin = useIsAdmin();
-  const [users, setUsers] = useState(mockUsers);
+  const [users, setUsers] = useState<AdminUser[]>([]);
+  const [filters, setFilters] = useState<UserFilters>({});
   const [selectedUser, setSelectedUser] = useState<any>(null);
   const [isEditDialogOpen, setIsEditDialogOpen] = useState(false);
 
@@ -97,6 +106,39 @@ export default function AdminPage() {
     enabled: isAdmin, // Only run if user is admin
   });
 
+  // Users, one keyset-paginated page at a time; the first page also
+  // carries the (possibly approximate) total for the current filters
+  const {
+    data: userPages,
+    error: usersError,
+    isLoading: isLoadingUsers,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
+    queryKey: ["adminUsers", filters],
+    queryFn: async ({ pageParam }) => {
+      const { data } = await api.listUsers({
+        ...filters,
+        limit: PAGE_SIZE,
+        cursor: pageParam,
+        total: pageParam ? undefined : "approximate",
+      });
+      return data;
+    },
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.next_cursor ?? undefined,
+    enabled: isAdmin,
+  });
+
+  const { data: activeCount } = useUserCount({ active: true }, isAdmin);
+  const { data: adminCount } = useUserCount({ role: "admin" }, isAdmin);
+
+  // Keep a local copy so the edit controls below can update rows in place
+  useEffect(() => {
+    setUsers(userPages?.pages.flatMap((page) => page.items) ?? []);
+  }, [userPages]);
+
   // Show error toast if API call fails
   useEffect(() => {
     if (error) {
@@ -104,6 +146,24 @@ export default function AdminPage() {
     }
   }, [error]);
 
+  useEffect(() => {
+    if (usersError) {
+      toast.error("Failed to load users");
+    }
+  }, [usersError]);
+
+  const updateFilter = (key: keyof UserFilters, value: string) => {
+    setFilters((current) => ({
+      ...current,
+      [key]:
+        key === "verified" || key === "active"
+          ? toBoolean(value)
+          : value === "all"
+          ? undefined
+          : value,
+    }));
+  };
+
   // Handle role toggle
   const handleRoleToggle = (userId: string, role: string) => {
     setUsers(
@@ -199,7 +259,9 @@ export default function AdminPage() {
                 <CardDescription>All registered users</CardDescription>
               </CardHeader>
               <CardContent>
-                <div className="text-4xl font-bold">{users.length}</div>
+                <div className="text-4xl font-bold">
+                  {formatCount(userPages?.pages[0])}
+                </div>
               </CardContent>
             </Card>
 
@@ -211,7 +273,7 @@ export default function AdminPage() {
               </CardHeader>
               <CardContent>
                 <div className="text-4xl font-bold">
-                  {users.filter((u) => u.is_active).length}
+                  {formatCount(activeCount)}
                 </div>
               </CardContent>
             </Card>
@@ -224,10 +286,7 @@ export default function AdminPage() {
               </CardHeader>
               <CardContent>
                 <div className="text-4xl font-bold">
-                  {
-                    users.filter((u) => u.roles.some((r) => r.name === "admin"))
-                      .length
-                  }
+                  {formatCount(adminCount)}
                 </div>
               </CardContent>
             </Card>
@@ -281,6 +340,60 @@ export default function AdminPage() {
               <CardDescription>Manage all registered users</CardDescription>
             </CardHeader>
             <CardContent>
+              <div className="flex flex-wrap gap-4 mb-4">
+                <Select
+                  defaultValue="all"
+                  onValueChange={(value) => updateFilter("role", value)}
+                >
+                  <SelectTrigger className="w-40">
+                    <SelectValue placeholder="Role" />
+                  </SelectTrigger>
+                  <SelectContent>
+                    <SelectItem value="all">All roles</SelectItem>
+                    <SelectItem value="admin">Admin</SelectItem>
+                    <SelectItem value="user">User</SelectItem>
+                  </SelectContent>
+                </Select>
+                <Select
+                  defaultValue="all"
+                  onValueChange={(value) => updateFilter("active", value)}
+                >
+                  <SelectTrigger className="w-40">
+                    <SelectValue placeholder="Status" />
+                  </SelectTrigger>
+                  <SelectContent>
+                    <SelectItem value="all">Any status</SelectItem>
+                    <SelectItem value="true">Active</SelectItem>
+                    <SelectItem value="false">Inactive</SelectItem>
+                  </SelectContent>
+                </Select>
+                <Select
+                  defaultValue="all"
+                  onValueChange={(value) => updateFilter("verified", value)}
+                >
+                  <SelectTrigger className="w-40">
+                    <SelectValue placeholder="Verified" />
+                  </SelectTrigger>
+                  <SelectContent>
+                    <SelectItem value="all">Any verification</SelectItem>
+                    <SelectItem value="true">Verified</SelectItem>
+                    <SelectItem value="false">Pending</SelectItem>
+                  </SelectContent>
+                </Select>
+                <Select
+                  defaultValue="all"
+                  onValueChange={(value) => updateFilter("oauth_provider", value)}
+                >
+                  <SelectTrigger className="w-40">
+                    <SelectValue placeholder="Sign-in method" />
+                  </SelectTrigger>
+                  <SelectContent>
+                    <SelectItem value="all">Any sign-in</SelectItem>
+                    <SelectItem value="none">Password</SelectItem>
+                    <SelectItem value="google">Google</SelectItem>
+                  </SelectContent>
+                </Select>
+              </div>
               <Table>
                 <TableHeader>
                   <TableRow>
@@ -354,7 +467,27 @@ export default function AdminPage() {
                   ))}
                 </TableBody>
               </Table>
+              {isLoadingUsers ? (
+                <div className="flex items-center justify-center h-20">
+                  <div className="w-6 h-6 border-4 border-blue-600 border-t-transparent rounded-full animate-spin"></div>
+                </div>
+              ) : users.length === 0 ? (
+                <p className="text-center py-8 text-gray-500">
+                  No users match these filters
+                </p>
+              ) : null}
             </CardContent>
+            {hasNextPage && (
+              <CardFooter className="justify-center">
+                <Button
+                  variant="outline"
+                  onClick={() => fetchNextPage()}
+                  disabled={isFetchingNextPage}
+                >
+                  {isFetchingNextPage ? "Loading..." : "Load more"}
+                </Button>
+              </CardFooter>
+            )}
           </Card>
 
           {/* Edit User Dialog */}
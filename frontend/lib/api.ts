@@ -12,6 +12,36 @@ interface ProfileUpdateData {
   password?: string;
 }
 
+// Admin user listing
+export interface AdminUser {
+  id: string;
+  email: string;
+  first_name?: string | null;
+  last_name?: string | null;
+  is_active: boolean;
+  is_verified: boolean;
+  oauth_provider?: string | null;
+  created_at: string;
+  roles: Array<{ id?: number; name: string }>;
+}
+
+export interface UserListParams {
+  limit?: number;
+  cursor?: string;
+  role?: string;
+  verified?: boolean;
+  active?: boolean;
+  oauth_provider?: string;
+  total?: "exact" | "approximate";
+}
+
+export interface UserPage {
+  items: AdminUser[];
+  next_cursor: string | null;
+  total: number | null;
+  total_is_approximate: boolean;
+}
+
 const apiClient = axios.create({
   baseURL: API_URL,
   headers: {
@@ -378,6 +408,10 @@ const api = {
   getProtectedData: () => apiClient.get("/protected"),
 
   getAdminData: () => apiClient.get("/admin"),
+
+  // Admin
+  listUsers: (params: UserListParams = {}) =>
+    apiClient.get<UserPage>("/users", { params }),
 };
 
 export default api;